@@ -8,7 +8,7 @@ from .client import client, get_thread, get_assistant
 from .logger import create_logger
 from .translate import _t
 from . import config
-from .helpers import ChatActions, is_valid_markdown, escape_markdown
+from .helpers import ChatActions, has_markdown, is_valid_markdown, escape_markdown
 from .users import is_group_bot
 from .message_queues import QueueController, thread_lock
 from .modes import get_mode
@@ -151,11 +151,13 @@ async def retrieve_messages(thread_id, run_id, message: types.Message):
 
       content = msg.content[0].text.value
       if content:
-        escaped = not is_valid_markdown(content)
+        # plain replies are sent without parse mode: nothing to validate, escape or parse
+        parse_mode = "Markdown" if has_markdown(content) else None
+        escaped = parse_mode is not None and not is_valid_markdown(content)
         if escaped:
           content = escape_markdown(content)
         logger.info(f"retrieve_messages:{msg.role}:{step.assistant_id}:escaped={escaped}:\n\t{content}")
-        await message.answer(content)
+        await message.answer(content, parse_mode=parse_mode)
 
 
 async def add_messages_to_thread(thread: beta.Thread, messages: List[types.Message]):
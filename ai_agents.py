@@ -3,7 +3,7 @@ AI-агенты для управления трекером задач чере
 """
 
 import json
-import yaml
+from collections import deque
 from pathlib import Path
 from typing import Dict, List, Optional, Any
 from datetime import datetime, date
@@ -22,7 +22,8 @@ try:
     from .tracker import (
         TrackerUserData, TrackerTask, TaskStatus, TaskPriority,
         EveningTrackingSession, EveningSessionState, TaskReviewItem,
-        DailySummary, TRACKER_STORAGE
+        DailySummary, TRACKER_STORAGE, AI_MENTOR_HISTORY_LIMIT, DAILY_SUMMARIES_LIMIT,
+        rebuild_task_indexes, serialize_user_data
     )
 except ImportError:
     # Fallback для тестирования
@@ -47,7 +48,18 @@ except ImportError:
     import time
     import uuid
     
-    TRACKER_STORAGE = Path("tracker_data.yaml")
+    TRACKER_STORAGE = Path("tracker_data")
+    AI_MENTOR_HISTORY_LIMIT = 20
+    DAILY_SUMMARIES_LIMIT = 30
+    
+    def rebuild_task_indexes(user_data):
+        pass
+    
+    def serialize_user_data(user_data):
+        user_dict = {name: list(value) if isinstance(value, deque) else value
+                     for name, value in vars(user_data).items()}
+        user_dict['tasks'] = [task.to_dict() for task in user_data.tasks]
+        return user_dict
     
     # Мок классы для тестирования
     class TrackerTask:
@@ -208,19 +220,25 @@ class BaseAgent:
     def _load_user_data(self, user_id: int) -> Optional[TrackerUserData]:
         """Загрузка данных пользователя"""
         try:
-            if TRACKER_STORAGE.exists():
-                with open(TRACKER_STORAGE, 'r', encoding='utf-8') as f:
-                    data = yaml.safe_load(f) or {}
-                    if str(user_id) in data:
-                        user_data = TrackerUserData(user_id)
-                        user_data.__dict__.update(data[str(user_id)])
-                        # Конвертируем задачи из dict в TrackerTask
-                        if 'tasks' in data[str(user_id)]:
-                            user_data.tasks = [
-                                TrackerTask.from_dict(task_data) 
-                                for task_data in data[str(user_id)]['tasks']
-                            ]
-                        return user_data
+            user_file = TRACKER_STORAGE / f"{user_id}.json"
+            if user_file.exists():
+                with open(user_file, 'r', encoding='utf-8') as f:
+                    user_dict = json.load(f) or {}
+                user_data = TrackerUserData(user_id)
+                for key, value in user_dict.items():
+                    if hasattr(user_data, key):
+                        setattr(user_data, key, value)
+                # Конвертируем задачи из dict в TrackerTask
+                if 'tasks' in user_dict:
+                    user_data.tasks = [
+                        TrackerTask.from_dict(task_data) 
+                        for task_data in user_dict['tasks']
+                    ]
+                # История и саммари хранятся в ограниченных deque, как в трекере
+                user_data.ai_mentor_history = deque(user_dict.get('ai_mentor_history', []), maxlen=AI_MENTOR_HISTORY_LIMIT)
+                user_data.daily_summaries = deque(user_dict.get('daily_summaries', []), maxlen=DAILY_SUMMARIES_LIMIT)
+                rebuild_task_indexes(user_data)
+                return user_data
             return None
         except Exception as e:
             logger.error(f"Error loading user data for {user_id}: {e}")
@@ -229,20 +247,12 @@ class BaseAgent:
     def _save_user_data(self, user_data: TrackerUserData) -> bool:
         """Сохранение данных пользователя"""
         try:
-            data = {}
-            if TRACKER_STORAGE.exists():
-                with open(TRACKER_STORAGE, 'r', encoding='utf-8') as f:
-                    data = yaml.safe_load(f) or {}
-            
-            # Конвертируем задачи в dict для сериализации
-            user_dict = user_data.__dict__.copy()
-            if 'tasks' in user_dict:
-                user_dict['tasks'] = [task.to_dict() for task in user_data.tasks]
+            # Задачи и deque-поля приводит к виду для JSON сериализатор трекера
+            user_dict = serialize_user_data(user_data)
             
-            data[str(user_data.user_id)] = user_dict
-            
-            with open(TRACKER_STORAGE, 'w', encoding='utf-8') as f:
-                yaml.dump(data, f, ensure_ascii=False, indent=2)
+            TRACKER_STORAGE.mkdir(parents=True, exist_ok=True)
+            with open(TRACKER_STORAGE / f"{user_data.user_id}.json", 'w', encoding='utf-8') as f:
+                json.dump(user_dict, f, ensure_ascii=False, indent=2)
             return True
         except Exception as e:
             logger.error(f"Error saving user data for {user_data.user_id}: {e}")
@@ -859,13 +869,9 @@ class EveningTrackerAgent(BaseAgent):
             session.summary = summary_response.content
             summary_data["summary_text"] = summary_response.content
             
-            # Добавляем саммари в долгосрочную память
+            # Добавляем саммари в долгосрочную память (deque хранит последние DAILY_SUMMARIES_LIMIT дней)
             user_data.daily_summaries.append(summary_data)
             
-            # Ограничиваем до 30 дней
-            if len(user_data.daily_summaries) > 30:
-                user_data.daily_summaries = user_data.daily_summaries[-30:]
-            
             # Завершаем сессию
             session.state = EveningSessionState.COMPLETED
             session.completed_at = int(datetime.now().timestamp())
@@ -974,7 +980,7 @@ class OrchestratorAgent(BaseAgent):
                 
                 # Добавляем информацию из недавних дневных саммари
                 if user_data.daily_summaries:
-                    recent_summaries = user_data.daily_summaries[-5:]  # Последние 5 дней
+                    recent_summaries = list(user_data.daily_summaries)[-5:]  # Последние 5 дней
                     context += "Недавняя активность: " + "; ".join([
                         f"{s['date']}: {s.get('productivity_level', 'unknown')} продуктивность"
                         for s in recent_summaries
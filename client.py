@@ -1,8 +1,25 @@
 from . import env
+import httpx
 from openai import AsyncOpenAI
 from .threads_factory import threads_factory
 from .assistants_factory import assistants_factory
 
-client = AsyncOpenAI(api_key=env.API_KEY, organization=env.ORG_ID)
+# HTTP/2 needs the optional h2 package; without it the pool stays on HTTP/1.1
+try:
+  import h2  # noqa: F401
+  _HTTP2 = True
+except ImportError:
+  _HTTP2 = False
+
+# one shared connection pool for all OpenAI calls (chat, assistants, whisper)
+http_client = httpx.AsyncClient(
+    http2=_HTTP2,
+    limits=httpx.Limits(max_connections=64, max_keepalive_connections=32),
+    # the SDK's default 600 s read timeout stays: long completions and transcriptions need it;
+    # only establishing a connection is kept short
+    timeout=httpx.Timeout(600.0, connect=5.0),
+)
+
+client = AsyncOpenAI(api_key=env.API_KEY, organization=env.ORG_ID, http_client=http_client)
 get_thread = threads_factory(client)
 get_assistant, asst_filter = assistants_factory(client)
@@ -11,7 +11,7 @@ from .helpers import escape_markdown, is_valid_markdown
 from .users import access_middleware
 from .modes import get_mode, mode_filter
 from .voice import decode_voice
-from .tracker import process_tracker_callback
+from .tracker import process_tracker_callback, request_clock_middleware
 from aiogram.types import WebAppInfo
 import httpx
 import asyncio
@@ -19,6 +19,8 @@ import asyncio
 logger = create_logger(__name__)
 router = Router()
 router.message.middleware(access_middleware)
+router.message.middleware(request_clock_middleware)
+router.callback_query.middleware(request_clock_middleware)
 
 # directory for temporary downloads
 DOWNLOADS_DIR = Path("downloads")
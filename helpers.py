@@ -32,6 +32,14 @@ def is_valid_markdown(markdown):
   return get_unclosed_tag(markdown) == ""
 
 
+_MARKDOWN_CHARS = frozenset("*_`[")
+
+
+def has_markdown(text):
+  # legacy Markdown only reacts to these characters; text without them renders the same as plain text
+  return not _MARKDOWN_CHARS.isdisjoint(text)
+
+
 def escape_markdown(text):
   special_chars = ["*", "_", "`"]
 
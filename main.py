@@ -2,11 +2,15 @@ from aiogram import Bot, Dispatcher
 from aiogram.enums import ParseMode
 from aiogram.client.default import DefaultBotProperties
 from .handlers import router
+from .tracker import flush_pending_saves
+from .users import init_users
 from . import env
 import signal
 import sys
 
 async def main():
+  init_users()
+
   bot = Bot(
       token=env.BOT_TOKEN,
       default=DefaultBotProperties(parse_mode=ParseMode.MARKDOWN),
@@ -24,6 +28,7 @@ async def main():
     def signal_handler(sig, frame):
         print('\nЗавершение работы...')
         stop_notifications()
+        flush_pending_saves()
         sys.exit(0)
     
     signal.signal(signal.SIGINT, signal_handler)
@@ -42,3 +47,6 @@ async def main():
       stop_notifications()
     except:
       pass
+
+    # Сохраняем отложенные изменения трекера
+    flush_pending_saves()
@@ -102,8 +102,10 @@ class NotificationManager:
     async def _send_daily_digest_to_all_users(self):
         """Отправляет ежедневный дайджест всем пользователям"""
         try:
-            from .tracker import load_tracker_data
+            from .tracker import load_tracker_data, flush_now
             
+            # Рассылка читает файлы напрямую - сначала сбрасываем отложенные изменения
+            await flush_now()
             all_data = load_tracker_data()
             
             for user_id_str, user_data_dict in all_data.items():
@@ -130,8 +132,10 @@ class NotificationManager:
     async def _send_deadline_reminders_to_all_users(self):
         """Отправляет напоминания о дедлайнах всем пользователям"""
         try:
-            from .tracker import load_tracker_data
+            from .tracker import load_tracker_data, flush_now
             
+            # Рассылка читает файлы напрямую - сначала сбрасываем отложенные изменения
+            await flush_now()
             all_data = load_tracker_data()
             
             for user_id_str, user_data_dict in all_data.items():
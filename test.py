@@ -99,7 +99,8 @@ async def test_defaults():
 ])
 def test_check_allowed_users(user_id, expected):
   with patch("builtins.open", mock_open(read_data=mock_allowed_users)):
-    from .users import check_user
+    from .users import check_user, init_users
+    init_users()
     from collections import namedtuple
     UserMock = namedtuple("UserMock", ["id", "username"])
     assert not check_user(UserMock(id=user_id, username=user_id)) == expected
@@ -176,3 +177,34 @@ async def test_multiple_requests(users, messages_data):
   user_map = {user.id: user for user in users}
   messages = create_messages(user_map, messages_data)
   await run_test_with_order_and_messages(users, messages)
+
+
+@pytest.mark.asyncio
+async def test_transcribe_voice():
+  import httpx
+  from openai import AsyncOpenAI
+  from . import voice
+
+  requests = []
+
+  def handler(request):
+    requests.append(request)
+    return httpx.Response(200, json={"text": " hello "})
+
+  stub_client = AsyncOpenAI(api_key="test", http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+
+  async def download(file_id, destination):
+    destination.write(b"OggS voice")
+
+  message = MagicMock()
+  message.voice.file_id = "file_id"
+  message.voice.duration = 3
+  message.bot.download = AsyncMock(side_effect=download)
+
+  with patch.object(voice, "client", stub_client):
+    assert await voice._transcribe(message) == "hello"
+
+  assert len(requests) == 1
+  body = requests[0].read()
+  assert b"OggS voice" in body
+  assert b'.ogg"' in body
@@ -1,36 +1,29 @@
+import asyncio
+import json
 import unittest
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, AsyncMock
 import tempfile
-import os
+import shutil
 import yaml
-import sys
 from pathlib import Path
-
-# Добавляем текущую директорию в Python path
-sys.path.insert(0, str(Path(__file__).parent))
-
-# Мокаем логгер перед импортом
-with patch('tracker.create_logger') as mock_logger:
-    mock_logger.return_value = MagicMock()
-    
-    # Тестируем функции трекера
-    from tracker import (
-        TrackerUserData, TrackerTask, TaskStatus, TaskPriority,
-        create_task, get_task_by_id, update_task_status, 
-        update_task_priority, delete_task, get_tasks_by_status,
-        get_tasks_sorted, format_task_text,
-        save_user_data, get_user_data
-    )
+from . import tracker
+from .tracker import (
+    TrackerUserData, TrackerTask, TaskStatus, TaskPriority,
+    create_task, get_task_by_id, update_task_status, 
+    update_task_priority, delete_task, get_tasks_by_status,
+    get_tasks_sorted, format_task_text,
+    save_user_data, get_user_data, get_task_count,
+    save_user_data_later, flush_now
+)
 
 class TestTrackerFunctions(unittest.TestCase):
     def setUp(self):
         """Настройка для каждого теста"""
-        # Создаем временный файл для тестов
-        self.temp_file = tempfile.NamedTemporaryFile(mode='w', suffix='.yaml', delete=False)
-        self.temp_file.close()
+        # Создаем временный каталог для тестов
+        self.temp_dir = tempfile.mkdtemp()
         
-        # Патчим путь к файлу данных
-        self.patcher = patch('tracker.TRACKER_STORAGE', Path(self.temp_file.name))
+        # Патчим путь к каталогу данных
+        self.patcher = patch.object(tracker, 'TRACKER_STORAGE', Path(self.temp_dir))
         self.patcher.start()
         
         # Создаем тестового пользователя
@@ -40,10 +33,7 @@ class TestTrackerFunctions(unittest.TestCase):
     def tearDown(self):
         """Очистка после каждого теста"""
         self.patcher.stop()
-        try:
-            os.unlink(self.temp_file.name)
-        except:
-            pass
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
     
     def test_create_task(self):
         """Тест создания задачи"""
@@ -136,6 +126,20 @@ class TestTrackerFunctions(unittest.TestCase):
         self.assertEqual(in_progress_tasks[0].title, "Задача 2")
         self.assertEqual(completed_tasks[0].title, "Задача 3")
     
+    def test_task_counts(self):
+        """Тест инкрементальных счетчиков задач по статусам"""
+        task1 = create_task(self.user_data, "Задача 1")
+        task2 = create_task(self.user_data, "Задача 2")
+        self.assertEqual(get_task_count(self.user_data, TaskStatus.PENDING), 2)
+        
+        update_task_status(self.user_data, task1.id, TaskStatus.COMPLETED)
+        self.assertEqual(get_task_count(self.user_data, TaskStatus.PENDING), 1)
+        self.assertEqual(get_task_count(self.user_data, TaskStatus.COMPLETED), 1)
+        
+        delete_task(self.user_data, task2.id)
+        self.assertEqual(get_task_count(self.user_data, TaskStatus.PENDING), 0)
+        self.assertEqual(get_task_count(get_user_data(123), TaskStatus.COMPLETED), 1)
+    
     def test_get_tasks_sorted(self):
         """Тест сортировки задач"""
         task1 = create_task(self.user_data, "Низкий приоритет", "", TaskPriority.LOW)
@@ -148,6 +152,11 @@ class TestTrackerFunctions(unittest.TestCase):
         self.assertEqual(sorted_tasks[1].title, "Высокий приоритет")
         self.assertEqual(sorted_tasks[2].title, "Низкий приоритет")
         
+        # Порядок обновляется при смене приоритета
+        update_task_priority(self.user_data, task1.id, TaskPriority.URGENT)
+        sorted_tasks = get_tasks_sorted(self.user_data, "priority")
+        self.assertEqual([t.title for t in sorted_tasks], ["Низкий приоритет", "Срочная задача", "Высокий приоритет"])
+        
         # Сортировка по дате создания (по умолчанию)
         sorted_by_date = get_tasks_sorted(self.user_data, "created_at")
         self.assertEqual(len(sorted_by_date), 3)
@@ -188,5 +197,115 @@ class TestTrackerFunctions(unittest.TestCase):
         self.assertEqual(loaded_user_data.tasks[1].title, "Задача 2")
         self.assertEqual(loaded_user_data.tasks[1].priority, TaskPriority.LOW)
 
+    def test_partial_save(self):
+        """Тест сохранения только выбранных полей"""
+        create_task(self.user_data, "Задача 1")
+        save_user_data(self.user_data)
+        
+        # Частичное сохранение не должно затирать остальные поля
+        other = TrackerUserData(123)
+        other.step = "completed"
+        save_user_data(other, fields=("completed", "step"))
+        
+        loaded_user_data = get_user_data(123)
+        self.assertEqual(loaded_user_data.step, "completed")
+        self.assertFalse(loaded_user_data.completed)
+        self.assertEqual(len(loaded_user_data.tasks), 1)
+
+    def test_first_partial_save(self):
+        """Тест частичного сохранения пользователя, у которого еще нет файла"""
+        path = Path(self.temp_dir) / "123.json"
+        self.user_data.step = "goals"
+        save_user_data(self.user_data, fields=("step",))
+        
+        record = json.loads(path.read_text(encoding='utf-8'))
+        self.assertEqual(record["step"], "goals")
+        self.assertEqual(record["started_at"], self.user_data.started_at)
+        
+        # Отложенная запись ведет себя так же
+        path.unlink()
+        self.user_data.step = "notifications"
+        
+        async def save_later():
+            save_user_data_later(self.user_data, fields=("step",))
+            await flush_now()
+        asyncio.run(save_later())
+        
+        record = json.loads(path.read_text(encoding='utf-8'))
+        self.assertEqual(record["step"], "notifications")
+        self.assertEqual(record["started_at"], self.user_data.started_at)
+
+    def test_unchanged_partial_save(self):
+        """Тест пропуска записи, если поля не изменились"""
+        save_user_data(self.user_data)
+        path = Path(self.temp_dir) / "123.json"
+        before = path.stat().st_mtime_ns
+        
+        with patch.object(tracker, 'save_user_record') as mock_save:
+            save_user_data(self.user_data, fields=("step", "completed"))
+            mock_save.assert_not_called()
+        self.assertEqual(path.stat().st_mtime_ns, before)
+
+    def test_user_cache(self):
+        """Тест кэша объектов пользователей"""
+        create_task(self.user_data, "Задача 1")
+        
+        first = get_user_data(123)
+        self.assertIs(get_user_data(123), first)
+        
+        # Запись файла в обход трекера сбрасывает кэш
+        (Path(self.temp_dir) / "123.json").write_text('{"step": "goals"}', encoding='utf-8')
+        reloaded = get_user_data(123)
+        self.assertIsNot(reloaded, first)
+        self.assertEqual(reloaded.step, "goals")
+        self.assertEqual(len(reloaded.tasks), 0)
+
+    def test_resolve_timezone_fallback(self):
+        """Тест перехода на UTC для некорректных имен поясов"""
+        self.assertEqual(tracker.resolve_timezone("Europe/Moscow").key, "Europe/Moscow")
+        for name in ("Mars/Olympus", "Europe", "a" * 5000):
+            self.assertIs(tracker.resolve_timezone(name), tracker.dt_timezone.utc)
+
+    def test_today_date_follows_request_clock(self):
+        """Тест даты дня, если время запроса сдвигается назад"""
+        self.user_data.timezone = "UTC"
+        for now, expected in ((1767268800, "2026-01-01"), (1767182400, "2025-12-31")):
+            token = tracker._request_now.set(now)
+            try:
+                self.assertEqual(tracker.get_today_date_str(self.user_data), expected)
+            finally:
+                tracker._request_now.reset(token)
+
+    def test_streaming_edits_release_ai_slot(self):
+        """Тест: правки потокового ответа не держат слот _ai_sem"""
+        async def chunks():
+            for part in ("При", "вет"):
+                await asyncio.sleep(0)
+                yield MagicMock(choices=[MagicMock(delta=MagicMock(content=part))])
+        
+        shown = []
+        
+        async def run():
+            other_done = asyncio.Event()
+            
+            async def other_request():
+                async with tracker._ai_sem:
+                    other_done.set()
+            
+            async def on_text(text):
+                # Пока идет правка, другой запрос должен получить слот
+                shown.append(text)
+                other = asyncio.create_task(other_request())
+                await asyncio.wait_for(other_done.wait(), 1)
+                await other
+            
+            fake_client = MagicMock()
+            fake_client.chat.completions.create = AsyncMock(return_value=chunks())
+            with patch.object(tracker, '_ai_sem', asyncio.Semaphore(1)), patch.object(tracker, 'client', fake_client):
+                return await tracker.ai_completion_text(on_text=on_text, model="test", messages=[])
+        
+        self.assertEqual(asyncio.run(run()), "Привет")
+        self.assertTrue(shown)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
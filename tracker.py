@@ -1,19 +1,116 @@
+import json
+import os
 import yaml
+import sys
 import time
+import asyncio
+import bisect
+import copy
+import functools
+import itertools
+import html
+import re
 from pathlib import Path
 from typing import Dict, List, Optional
 from aiogram import types
 from .logger import create_logger
 from .client import client
 from .constants import GPT4_MODEL
+from .helpers import ChatActions
 import uuid
-from datetime import datetime, timedelta, date
-import pytz
+from collections import OrderedDict, deque
+from contextvars import ContextVar
+from datetime import datetime, timedelta, date, timezone as dt_timezone, tzinfo
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+# YAML нужен только для миграции старого хранилища tracker_data.yaml;
+# C-реализация libyaml заметно быстрее чистого Python, если доступна
+try:
+    from yaml import CSafeLoader as _YamlLoader
+except ImportError:
+    from yaml import SafeLoader as _YamlLoader
 
 logger = create_logger(__name__)
 
-# Файл для хранения данных трекера
-TRACKER_STORAGE = Path(__file__).parent / "tracker_data.yaml"
+# Каталог для хранения данных трекера: по одному JSON файлу на пользователя
+TRACKER_STORAGE = Path(__file__).parent / "tracker_data"
+# Каталог, для которого уже проверено наличие и выполнена миграция
+_storage_ready: Optional[Path] = None
+
+# Отложенная запись: снимки данных пользователей копятся в памяти
+# и сбрасываются на диск пачкой
+SAVE_FLUSH_DELAY = 0.1
+SAVE_BATCH_SIZE = 32
+_pending_saves: Dict[str, Dict] = {}
+# Пользователи, для которых в _pending_saves лежит только часть полей
+_pending_partial: set = set()
+_flush_task: Optional[asyncio.Task] = None
+
+# Разобранные файлы пользователей: ключ -> (путь, mtime_ns, размер, данные).
+# Пока файл не изменился, повторные чтения обходятся без разбора JSON
+_storage_cache: Dict[str, tuple] = {}
+
+# Готовые объекты пользователей: ключ -> (подпись файла, TrackerUserData).
+# Объект отдается повторно, пока файл на диске не изменили в обход трекера
+USER_CACHE_MAX = 1024
+_user_cache: "OrderedDict[str, tuple]" = OrderedDict()
+
+# Повторно доставленные или нажатые дважды разовые кнопки онбординга
+# (вызов AI-ментора, завершение настройки) обрабатываются только один раз
+CALLBACK_DEDUP_TTL = 60.0
+CALLBACK_DEDUP_MAX = 1000
+_DEDUP_CALLBACKS = frozenset({"tracker_meet_ai_mentor", "tracker_step_6_completion"})
+_processed_callbacks: "OrderedDict[tuple, float]" = OrderedDict()
+
+# Защита от многократных нажатий: пока отрисовка экрана для сообщения еще идет,
+# такие же повторные отрисовки пропускаются. Завершившаяся отрисовка ничего не блокирует,
+# поэтому показ после изменения состояния всегда доходит до пользователя
+_renders_in_flight: set = set()
+
+# Отпечатки последнего показанного содержимого сообщений: (chat_id, message_id) -> hash
+RENDER_FINGERPRINTS_MAX = 1024
+_render_fingerprints: "OrderedDict[tuple, int]" = OrderedDict()
+
+# Ограничение исходящих сообщений: не более SEND_RATE_LIMIT в секунду
+# (лимит Telegram Bot API) и не более SEND_CONCURRENCY одновременно
+SEND_RATE_LIMIT = 30
+SEND_CONCURRENCY = 28
+_send_sem = asyncio.Semaphore(SEND_CONCURRENCY)
+_send_tokens = float(SEND_RATE_LIMIT)
+_send_tokens_ts = time.monotonic()
+
+# Не более AI_CONCURRENCY одновременных запросов к OpenAI на весь процесс:
+# всплеск сообщений не выбирает пул соединений и лимиты API
+AI_CONCURRENCY = 8
+_ai_sem = asyncio.Semaphore(AI_CONCURRENCY)
+
+# Потоковые ответы AI обновляют сообщение не чаще раза в секунду (лимит Telegram на чат)
+STREAM_EDIT_INTERVAL = 1.0
+
+# Момент начала обработки текущего апдейта: все даты и метки времени одного
+# обработчика считаются от него, поэтому не расходятся на границе суток
+_request_now: ContextVar[Optional[float]] = ContextVar("tracker_request_now", default=None)
+
+def request_now() -> float:
+    """Текущее время обработки апдейта (или time.time() вне обработчика)"""
+    now = _request_now.get()
+    return time.time() if now is None else now
+
+async def request_clock_middleware(handler, event, data):
+    """Middleware aiogram: фиксирует время начала обработки апдейта"""
+    token = _request_now.set(time.time())
+    try:
+        return await handler(event, data)
+    finally:
+        _request_now.reset(token)
+
+# Ограничения истории: 20 сообщений с AI-ментором (10 пар вопрос-ответ)
+# и дневные саммари за последние 30 дней
+AI_MENTOR_HISTORY_LIMIT = 20
+DAILY_SUMMARIES_LIMIT = 30
+# Разговор вечерней сессии сохраняется на диск не длиннее 20 сообщений;
+# в памяти в течение сессии он остается целиком
+EVENING_CONVERSATION_LIMIT = 20
 
 # Состояния приветственного модуля
 class WelcomeState:
@@ -42,48 +139,52 @@ class TaskPriority:
 
 # Структура задачи
 class TrackerTask:
+    __slots__ = ('id', 'title', 'description', 'priority', 'status',
+                 'created_at', 'updated_at', 'due_date', 'completed_at')
+    
     def __init__(self, title: str, description: str = "", priority: str = TaskPriority.MEDIUM):
         self.id = str(uuid.uuid4())
         self.title = title
         self.description = description
         self.priority = priority
         self.status = TaskStatus.PENDING
-        self.created_at = int(time.time())
-        self.updated_at = int(time.time())
+        self.created_at = int(request_now())
+        self.updated_at = int(request_now())
         self.due_date = None
         self.completed_at = None
     
     def to_dict(self) -> Dict:
-        return {
-            'id': self.id,
-            'title': self.title,
-            'description': self.description,
-            'priority': self.priority,
-            'status': self.status,
-            'created_at': self.created_at,
-            'updated_at': self.updated_at,
-            'due_date': self.due_date,
-            'completed_at': self.completed_at
-        }
+        return {name: getattr(self, name) for name in self.__slots__}
     
     @classmethod
     def from_dict(cls, data: Dict) -> 'TrackerTask':
-        task = cls(data['title'], data.get('description', ''), data.get('priority', TaskPriority.MEDIUM))
+        # __init__ не вызывается: новый uuid и текущее время все равно перезаписываются
+        task = cls.__new__(cls)
         task.id = data['id']
-        task.status = data.get('status', TaskStatus.PENDING)
-        task.created_at = data.get('created_at', int(time.time()))
-        task.updated_at = data.get('updated_at', int(time.time()))
+        task.title = data['title']
+        task.description = data.get('description', '')
+        # Значения из файла интернируются, чтобы сравнения с константами шли по идентичности
+        task.priority = sys.intern(data.get('priority', TaskPriority.MEDIUM))
+        task.status = sys.intern(data.get('status', TaskStatus.PENDING))
+        task.created_at = data['created_at'] if 'created_at' in data else int(request_now())
+        task.updated_at = data['updated_at'] if 'updated_at' in data else int(request_now())
         task.due_date = data.get('due_date')
         task.completed_at = data.get('completed_at')
         return task
 
 # Структура данных пользователя трекера
 class TrackerUserData:
+    __slots__ = ('user_id', 'step', 'completed', 'started_at', 'anxiety_level', 'anxiety_answers',
+                 'goals', 'custom_goal', 'notifications', 'met_ai_mentor', 'ai_mentor_history',
+                 'tasks', 'current_view', 'timezone', 'notification_time',
+                 'evening_tracking_enabled', 'evening_tracking_time', 'current_evening_session',
+                 'daily_summaries', '_by_id', '_by_status', '_by_priority', '_order', '_next_order', '_tz_cache', '_summary_dates')
+    
     def __init__(self, user_id: int):
         self.user_id = user_id
         self.step = WelcomeState.STEP_1_GREETING
         self.completed = False
-        self.started_at = int(time.time())
+        self.started_at = int(request_now())
         self.anxiety_level = None
         self.anxiety_answers = []
         self.goals = []
@@ -95,7 +196,7 @@ class TrackerUserData:
             "enabled": True
         }
         self.met_ai_mentor = False
-        self.ai_mentor_history = []  # История разговоров с AI-ментором
+        self.ai_mentor_history = deque(maxlen=AI_MENTOR_HISTORY_LIMIT)  # История разговоров с AI-ментором
         self.tasks = []  # Массив задач пользователя
         self.current_view = "main"  # Текущий вид интерфейса (main, tasks, add_task, etc.)
         self.timezone = "UTC"  # Часовой пояс пользователя
@@ -105,7 +206,60 @@ class TrackerUserData:
         self.evening_tracking_enabled = True  # Включен ли вечерний трекер
         self.evening_tracking_time = "21:00"  # Время вечернего трекера
         self.current_evening_session = None  # Текущая сессия вечернего трекера
-        self.daily_summaries = []  # Список дневных саммари для долгосрочной памяти
+        self.daily_summaries = deque(maxlen=DAILY_SUMMARIES_LIMIT)  # Дневные саммари для долгосрочной памяти
+        self._summary_dates = set()  # Даты из daily_summaries (не сохраняется)
+        
+        # Индексы задач (не сохраняются, перестраиваются при загрузке):
+        # по ID, по статусу и порядковый номер задачи в списке tasks
+        self._by_id = {}
+        self._by_status = {}
+        self._order = {}
+        self._next_order = 0
+        self._by_priority = []  # Задачи в порядке показа в меню: приоритет, затем давность
+        # Кешированный объект часового пояса (не сохраняется)
+        self._tz_cache = None  # (имя пояса, tzinfo)
+
+def rebuild_task_indexes(user_data: TrackerUserData):
+    """Перестраивает индексы задач по ID, статусу и приоритету"""
+    user_data._by_id = {}
+    user_data._by_status = {}
+    user_data._order = {}
+    for position, task in enumerate(user_data.tasks):
+        user_data._by_id[task.id] = task
+        user_data._by_status.setdefault(task.status, []).append(task)
+        user_data._order[task.id] = position
+    user_data._next_order = len(user_data.tasks)
+    user_data._by_priority = sorted(user_data.tasks, key=functools.partial(_priority_sort_key, user_data))
+
+def _priority_sort_key(user_data: TrackerUserData, task: "TrackerTask") -> tuple:
+    """Ключ порядка в меню задач: сначала более важные, среди равных - более старые,
+    при совпадении - в порядке списка tasks"""
+    return (-_PRIORITY_ORDER.get(task.priority, 0), task.created_at, user_data._order[task.id])
+
+def _index_task(user_data: TrackerUserData, task: "TrackerTask"):
+    """Добавляет новую задачу в индексы"""
+    user_data._by_id[task.id] = task
+    user_data._order[task.id] = user_data._next_order
+    user_data._next_order += 1
+    user_data._by_status.setdefault(task.status, []).append(task)
+    bisect.insort(user_data._by_priority, task, key=functools.partial(_priority_sort_key, user_data))
+
+def _unindex_task(user_data: TrackerUserData, task: "TrackerTask"):
+    """Удаляет задачу из индексов"""
+    del user_data._by_id[task.id]
+    del user_data._order[task.id]
+    user_data._by_status[task.status].remove(task)
+    user_data._by_priority.remove(task)
+
+def _reindex_task_status(user_data: TrackerUserData, task: "TrackerTask", new_status: str):
+    """Переносит задачу в индексе статусов, сохраняя порядок списка tasks"""
+    user_data._by_status[task.status].remove(task)
+    order = user_data._order
+    bisect.insort(user_data._by_status.setdefault(new_status, []), task, key=lambda t: order[t.id])
+
+def get_task_count(user_data: TrackerUserData, status: str) -> int:
+    """Возвращает количество задач с указанным статусом"""
+    return len(user_data._by_status.get(status, ()))
 
 # Классы для вечернего трекера
 class EveningSessionState:
@@ -118,6 +272,9 @@ class EveningSessionState:
 
 class TaskReviewItem:
     """Элемент обзора задачи в вечерней сессии"""
+    __slots__ = ('task_id', 'task_title', 'progress_description', 'needs_help',
+                 'help_provided', 'ai_support', 'completed')
+    
     def __init__(self, task_id: str, task_title: str):
         self.task_id = task_id
         self.task_title = task_title
@@ -128,15 +285,7 @@ class TaskReviewItem:
         self.completed = False  # Завершен ли обзор этой задачи
     
     def to_dict(self) -> Dict:
-        return {
-            'task_id': self.task_id,
-            'task_title': self.task_title,
-            'progress_description': self.progress_description,
-            'needs_help': self.needs_help,
-            'help_provided': self.help_provided,
-            'ai_support': self.ai_support,
-            'completed': self.completed
-        }
+        return {name: getattr(self, name) for name in self.__slots__}
     
     @classmethod
     def from_dict(cls, data: Dict) -> 'TaskReviewItem':
@@ -150,11 +299,14 @@ class TaskReviewItem:
 
 class EveningTrackingSession:
     """Сессия вечернего трекера"""
+    __slots__ = ('user_id', 'date', 'state', 'started_at', 'completed_at', 'task_reviews',
+                 'current_task_index', 'gratitude_answer', 'summary', 'ai_conversation')
+    
     def __init__(self, user_id: int, date_str: str):
         self.user_id = user_id
         self.date = date_str  # YYYY-MM-DD формат
         self.state = EveningSessionState.STARTING
-        self.started_at = int(time.time())
+        self.started_at = int(request_now())
         self.completed_at = None
         self.task_reviews = []  # List[TaskReviewItem]
         self.current_task_index = 0  # Индекс текущей обрабатываемой задачи
@@ -173,14 +325,15 @@ class EveningTrackingSession:
             'current_task_index': self.current_task_index,
             'gratitude_answer': self.gratitude_answer,
             'summary': self.summary,
-            'ai_conversation': self.ai_conversation
+            'ai_conversation': self.ai_conversation[-EVENING_CONVERSATION_LIMIT:]
         }
     
     @classmethod
     def from_dict(cls, data: Dict) -> 'EveningTrackingSession':
         session = cls(data['user_id'], data['date'])
-        session.state = data.get('state', EveningSessionState.STARTING)
-        session.started_at = data.get('started_at', int(time.time()))
+        session.state = sys.intern(data.get('state', EveningSessionState.STARTING))
+        if 'started_at' in data:
+            session.started_at = data['started_at']
         session.completed_at = data.get('completed_at')
         session.task_reviews = [TaskReviewItem.from_dict(review) for review in data.get('task_reviews', [])]
         session.current_task_index = data.get('current_task_index', 0)
@@ -191,10 +344,14 @@ class EveningTrackingSession:
 
 class DailySummary:
     """Дневное саммари для долгосрочной памяти AI-ментора"""
+    __slots__ = ('date', 'user_id', 'created_at', 'tasks_reviewed', 'tasks_with_progress',
+                 'tasks_needing_help', 'gratitude_theme', 'key_insights', 'mood_indicators',
+                 'productivity_level', 'summary_text')
+    
     def __init__(self, date_str: str, user_id: int):
         self.date = date_str  # YYYY-MM-DD
         self.user_id = user_id
-        self.created_at = int(time.time())
+        self.created_at = int(request_now())
         self.tasks_reviewed = 0  # Количество проверенных задач
         self.tasks_with_progress = 0  # Задач с прогрессом
         self.tasks_needing_help = 0  # Задач, требующих помощи
@@ -205,24 +362,13 @@ class DailySummary:
         self.summary_text = ""  # Текстовое саммари
     
     def to_dict(self) -> Dict:
-        return {
-            'date': self.date,
-            'user_id': self.user_id,
-            'created_at': self.created_at,
-            'tasks_reviewed': self.tasks_reviewed,
-            'tasks_with_progress': self.tasks_with_progress,
-            'tasks_needing_help': self.tasks_needing_help,
-            'gratitude_theme': self.gratitude_theme,
-            'key_insights': self.key_insights,
-            'mood_indicators': self.mood_indicators,
-            'productivity_level': self.productivity_level,
-            'summary_text': self.summary_text
-        }
+        return {name: getattr(self, name) for name in self.__slots__}
     
     @classmethod
     def from_dict(cls, data: Dict) -> 'DailySummary':
         summary = cls(data['date'], data['user_id'])
-        summary.created_at = data.get('created_at', int(time.time()))
+        if 'created_at' in data:
+            summary.created_at = data['created_at']
         summary.tasks_reviewed = data.get('tasks_reviewed', 0)
         summary.tasks_with_progress = data.get('tasks_with_progress', 0)
         summary.tasks_needing_help = data.get('tasks_needing_help', 0)
@@ -233,47 +379,171 @@ class DailySummary:
         summary.summary_text = data.get('summary_text', '')
         return summary
 
-def load_tracker_data() -> Dict:
-    """Загружает данные трекера из YAML файла"""
+def _user_storage_path(key: str) -> Path:
+    """Путь к файлу данных одного пользователя"""
+    return TRACKER_STORAGE / f"{key}.json"
+
+def _load_legacy_storage() -> Dict:
+    """Читает общий файл данных старого формата (tracker_data.json или tracker_data.yaml)"""
+    legacy_json = TRACKER_STORAGE.with_suffix('.json')
+    legacy_yaml = TRACKER_STORAGE.with_suffix('.yaml')
+    try:
+        if legacy_json.exists():
+            with open(legacy_json, 'r', encoding='utf-8') as file:
+                content = file.read()
+            return json.loads(content) if content else {}
+        if legacy_yaml.exists():
+            with open(legacy_yaml, 'r', encoding='utf-8') as file:
+                return yaml.load(file, Loader=_YamlLoader) or {}
+    except (OSError, ValueError, yaml.YAMLError) as e:
+        logger.error(f"Error loading legacy tracker data: {e}")
+    return {}
+
+def _ensure_storage():
+    """Создает каталог данных; при первом запуске переносит в него старый общий файл"""
+    global _storage_ready
+    if _storage_ready == TRACKER_STORAGE:
+        return
+    if not TRACKER_STORAGE.is_dir():
+        legacy_data = _load_legacy_storage()
+        TRACKER_STORAGE.mkdir(parents=True, exist_ok=True)
+        for key, record in legacy_data.items():
+            _write_user_record(str(key), record)
+        if legacy_data:
+            logger.info(f"Migrated tracker data for {len(legacy_data)} users to {TRACKER_STORAGE}")
+    _storage_ready = TRACKER_STORAGE
+
+def _write_user_record(key: str, record: Dict):
+    """Атомарно записывает файл одного пользователя"""
+    path = _user_storage_path(key)
+    tmp_path = path.with_name(path.name + '.tmp')
+    # Сохраняемые записи могут ссылаться на живые объекты пользователей,
+    # поэтому кэш не заполняется из record, а перечитывается при следующей загрузке
+    _storage_cache.pop(key, None)
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump(record, file, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+    except (OSError, TypeError, ValueError) as e:
+        logger.error(f"Error saving tracker data for user {key}: {e}")
+
+def _file_signature(key: str) -> Optional[tuple]:
+    """Подпись файла пользователя (путь, mtime_ns, размер) или None, если файла нет"""
+    path = _user_storage_path(key)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (str(path), stat.st_mtime_ns, stat.st_size)
+
+def _cache_user(key: str, user_data: TrackerUserData):
+    """Запоминает объект пользователя, вытесняя самые давние записи"""
+    _user_cache[key] = (_file_signature(key), user_data)
+    _user_cache.move_to_end(key)
+    if len(_user_cache) > USER_CACHE_MAX:
+        _user_cache.popitem(last=False)
+
+def load_user_record(key: str) -> Dict:
+    """Загружает запись одного пользователя
+    
+    Запись общая с кэшем - ее нельзя изменять на месте, только заменять.
+    """
+    _ensure_storage()
+    path = _user_storage_path(key)
     try:
-        with open(TRACKER_STORAGE, 'r', encoding='utf-8') as file:
-            return yaml.safe_load(file) or {}
+        stat = os.stat(path)
+        cache_key = (str(path), stat.st_mtime_ns, stat.st_size)
+        cached = _storage_cache.get(key)
+        if cached is not None and cached[:3] == cache_key:
+            return cached[3]
+        
+        with open(path, 'r', encoding='utf-8') as file:
+            content = file.read()
+        record = json.loads(content) if content else {}
+        _storage_cache[key] = cache_key + (record,)
+        return record
     except FileNotFoundError:
         return {}
-    except Exception as e:
-        logger.error(f"Error loading tracker data: {e}")
+    except (OSError, ValueError) as e:
+        logger.error(f"Error loading tracker data for user {key}: {e}")
         return {}
 
+def save_user_record(key: str, record: Dict):
+    """Сохраняет запись одного пользователя
+    
+    Запись построена из объекта в кэше, поэтому он остается актуальным -
+    обновляется только подпись файла.
+    """
+    _ensure_storage()
+    _write_user_record(key, record)
+    cached = _user_cache.get(key)
+    if cached is not None:
+        _user_cache[key] = (_file_signature(key), cached[1])
+
+def load_tracker_data() -> Dict:
+    """Загружает данные всех пользователей (для рассылок и администрирования)
+    
+    Записи пользователей общие с кэшем - их нельзя изменять на месте, только заменять.
+    """
+    _ensure_storage()
+    return {path.stem: load_user_record(path.stem) for path in TRACKER_STORAGE.glob('*.json')}
+
 def save_tracker_data(data: Dict):
-    """Сохраняет данные трекера в YAML файл"""
-    try:
-        with open(TRACKER_STORAGE, 'w', encoding='utf-8') as file:
-            yaml.dump(data, file, allow_unicode=True, default_flow_style=False)
-    except Exception as e:
-        logger.error(f"Error saving tracker data: {e}")
+    """Сохраняет данные нескольких пользователей, каждого в свой файл"""
+    _ensure_storage()
+    for key, record in data.items():
+        key = str(key)
+        _write_user_record(key, record)
+        _user_cache.pop(key, None)
 
 def get_user_data(user_id: int) -> TrackerUserData:
-    """Получает данные пользователя трекера"""
-    all_data = load_tracker_data()
-    user_data_dict = all_data.get(str(user_id), {})
+    """Получает данные пользователя трекера
+    
+    Горячие пользователи отдаются из кэша объектов; если файл изменили
+    в обход трекера, объект собирается заново.
+    """
+    key = str(user_id)
+    cached = _user_cache.get(key)
+    if cached is not None and (key in _pending_saves or cached[0] == _file_signature(key)):
+        _user_cache.move_to_end(key)
+        return cached[1]
+    
+    user_data = _build_user_data(user_id)
+    _cache_user(key, user_data)
+    return user_data
+
+def _build_user_data(user_id: int) -> TrackerUserData:
+    """Собирает объект пользователя из отложенной записи и файла на диске"""
+    key = str(user_id)
+    pending = _pending_saves.get(key)
+    if pending is not None and key not in _pending_partial:
+        # Еще не записанный снимок свежее данных на диске
+        user_data_dict = copy.deepcopy(pending)
+    else:
+        user_data_dict = copy.deepcopy(load_user_record(key))
+        if pending is not None:
+            # Поверх данных с диска накладываем еще не записанные поля
+            user_data_dict = {**user_data_dict, **copy.deepcopy(pending)}
     
     # Создаем объект TrackerUserData
     user_data = TrackerUserData(user_id)
     if user_data_dict:
-        user_data.step = user_data_dict.get('step', WelcomeState.STEP_1_GREETING)
+        user_data.step = sys.intern(user_data_dict.get('step', WelcomeState.STEP_1_GREETING))
         user_data.completed = user_data_dict.get('completed', False)
-        user_data.started_at = user_data_dict.get('started_at', int(time.time()))
+        user_data.started_at = user_data_dict.get('started_at', user_data.started_at)
         user_data.anxiety_level = user_data_dict.get('anxiety_level')
         user_data.anxiety_answers = user_data_dict.get('anxiety_answers', [])
-        user_data.goals = user_data_dict.get('goals', [])
+        # Неизвестные цели отбрасываются при загрузке, дальше идентификаторы считаются проверенными
+        user_data.goals = [goal for goal in user_data_dict.get('goals', []) if goal in GOAL_DESCRIPTIONS]
         user_data.custom_goal = user_data_dict.get('custom_goal')
         user_data.notifications = user_data_dict.get('notifications', user_data.notifications)
         user_data.met_ai_mentor = user_data_dict.get('met_ai_mentor', False)
-        user_data.ai_mentor_history = user_data_dict.get('ai_mentor_history', [])
+        user_data.ai_mentor_history = deque(user_data_dict.get('ai_mentor_history', []), maxlen=AI_MENTOR_HISTORY_LIMIT)
         
         # Загружаем задачи
         tasks_data = user_data_dict.get('tasks', [])
         user_data.tasks = [TrackerTask.from_dict(task_dict) for task_dict in tasks_data]
+        rebuild_task_indexes(user_data)
         user_data.current_view = user_data_dict.get('current_view', 'main')
         user_data.timezone = user_data_dict.get('timezone', 'UTC')
         user_data.notification_time = user_data_dict.get('notification_time', '09:00')
@@ -282,14 +552,43 @@ def get_user_data(user_id: int) -> TrackerUserData:
         user_data.evening_tracking_enabled = user_data_dict.get('evening_tracking_enabled', True)
         user_data.evening_tracking_time = user_data_dict.get('evening_tracking_time', '21:00')
         user_data.current_evening_session = user_data_dict.get('current_evening_session')
-        user_data.daily_summaries = user_data_dict.get('daily_summaries', [])
+        user_data.daily_summaries = deque(user_data_dict.get('daily_summaries', []), maxlen=DAILY_SUMMARIES_LIMIT)
+        refresh_summary_dates(user_data)
     
     return user_data
 
-def save_user_data(user_data: TrackerUserData):
-    """Сохраняет данные пользователя"""
-    all_data = load_tracker_data()
-    all_data[str(user_data.user_id)] = {
+def _summary_date(summary) -> Optional[str]:
+    """Дата дневного саммари (словарь или объект DailySummary)"""
+    if isinstance(summary, dict):
+        return summary.get('date')
+    return getattr(summary, 'date', None)
+
+def refresh_summary_dates(user_data: TrackerUserData):
+    """Перестраивает множество дат дневных саммари"""
+    user_data._summary_dates = {_summary_date(summary) for summary in user_data.daily_summaries}
+
+def add_daily_summary(user_data: TrackerUserData, summary: Dict):
+    """Добавляет дневное саммари; самые старые вытесняются ограничением deque"""
+    user_data.daily_summaries.append(summary)
+    refresh_summary_dates(user_data)
+
+def _serialize_field(user_data: TrackerUserData, name: str):
+    """Приводит одно поле пользователя к виду для хранения"""
+    value = getattr(user_data, name)
+    if name == 'tasks':
+        return [task.to_dict() for task in value]
+    if isinstance(value, deque):
+        return list(value)
+    return value
+
+def serialize_user_data(user_data: TrackerUserData, fields: Optional[tuple] = None) -> Dict:
+    """Преобразует данные пользователя в словарь для хранения
+    
+    Если передан fields, сериализуются только перечисленные поля.
+    """
+    if fields is not None:
+        return {name: _serialize_field(user_data, name) for name in fields}
+    return {
         'step': user_data.step,
         'completed': user_data.completed,
         'started_at': user_data.started_at,
@@ -299,7 +598,7 @@ def save_user_data(user_data: TrackerUserData):
         'custom_goal': user_data.custom_goal,
         'notifications': user_data.notifications,
         'met_ai_mentor': user_data.met_ai_mentor,
-        'ai_mentor_history': user_data.ai_mentor_history,
+        'ai_mentor_history': list(user_data.ai_mentor_history),
         'tasks': [task.to_dict() for task in user_data.tasks],
         'current_view': user_data.current_view,
         'timezone': user_data.timezone,
@@ -307,9 +606,115 @@ def save_user_data(user_data: TrackerUserData):
         'evening_tracking_enabled': user_data.evening_tracking_enabled,
         'evening_tracking_time': user_data.evening_tracking_time,
         'current_evening_session': user_data.current_evening_session,
-        'daily_summaries': user_data.daily_summaries
+        'daily_summaries': list(user_data.daily_summaries)
     }
-    save_tracker_data(all_data)
+
+def _take_pending_record(key: str) -> Optional[Dict]:
+    """Извлекает из очереди отложенную запись пользователя, дополняя частичную данными с диска"""
+    record = _pending_saves.pop(key, None)
+    if record is not None and key in _pending_partial:
+        _pending_partial.discard(key)
+        record = {**load_user_record(key), **record}
+    return record
+
+def flush_pending_saves():
+    """Записывает на диск все отложенные снимки данных пользователей"""
+    for key in list(_pending_saves):
+        save_user_record(key, _take_pending_record(key))
+
+async def _delayed_flush():
+    """Ждет накопления изменений и сбрасывает их одним проходом"""
+    global _flush_task
+    try:
+        await asyncio.sleep(SAVE_FLUSH_DELAY)
+    finally:
+        if _flush_task is asyncio.current_task():
+            _flush_task = None
+        flush_pending_saves()
+
+async def flush_now():
+    """Немедленно записывает отложенные изменения, не дожидаясь таймера"""
+    global _flush_task
+    task, _flush_task = _flush_task, None
+    if task is not None:
+        task.cancel()
+    flush_pending_saves()
+
+def _patch_unchanged(key: str, patch: Dict) -> bool:
+    """Проверяет, что частичное обновление совпадает с тем, что уже лежит на диске"""
+    record = load_user_record(key)
+    return all(name in record and record[name] == value for name, value in patch.items())
+
+def _sync_user_cache(key: str, user_data: TrackerUserData, fields: Optional[tuple]):
+    """Согласует кэш объектов с сохраняемым объектом пользователя
+    
+    Полный снимок другого объекта заменяет закэшированный, частичный - делает его устаревшим.
+    """
+    cached = _user_cache.get(key)
+    if cached is None or cached[1] is user_data:
+        return
+    if fields is None:
+        _user_cache[key] = (None, user_data)
+    else:
+        del _user_cache[key]
+
+def save_user_data(user_data: TrackerUserData, fields: Optional[tuple] = None):
+    """Сохраняет данные пользователя
+    
+    Записывается только файл этого пользователя. С параметром fields
+    обновляются только указанные поля записи, остальные остаются такими, как на диске.
+    """
+    key = str(user_data.user_id)
+    _sync_user_cache(key, user_data, fields)
+    if fields is None:
+        # Полный снимок заменяет и отложенную запись этого пользователя
+        _pending_saves.pop(key, None)
+        _pending_partial.discard(key)
+        record = serialize_user_data(user_data)
+    else:
+        patch = serialize_user_data(user_data, fields)
+        base = _take_pending_record(key)
+        if base is None:
+            if _patch_unchanged(key, patch):
+                # Повторное нажатие или возврат на тот же шаг - писать нечего
+                return
+            # Записи на диске еще нет - начинаем с полного снимка, чтобы в файл
+            # попали не только обновляемые поля
+            base = load_user_record(key) or serialize_user_data(user_data)
+        record = {**base, **patch}
+    save_user_record(key, record)
+
+def save_user_data_later(user_data: TrackerUserData, fields: Optional[tuple] = None):
+    """Ставит данные пользователя в очередь на отложенную запись"""
+    global _flush_task
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        # Вне event loop (скрипты, тесты) пишем сразу
+        save_user_data(user_data, fields)
+        return
+    
+    key = str(user_data.user_id)
+    _sync_user_cache(key, user_data, fields)
+    if fields is None:
+        _pending_saves[key] = copy.deepcopy(serialize_user_data(user_data))
+        _pending_partial.discard(key)
+    elif key in _pending_saves:
+        _pending_saves[key].update(copy.deepcopy(serialize_user_data(user_data, fields)))
+    else:
+        patch = serialize_user_data(user_data, fields)
+        if _patch_unchanged(key, patch):
+            return
+        if load_user_record(key):
+            _pending_saves[key] = copy.deepcopy(patch)
+            _pending_partial.add(key)
+        else:
+            # Первая запись пользователя - ставим в очередь полный снимок
+            _pending_saves[key] = copy.deepcopy(serialize_user_data(user_data))
+    if len(_pending_saves) >= SAVE_BATCH_SIZE:
+        flush_pending_saves()
+    elif _flush_task is None:
+        _flush_task = loop.create_task(_delayed_flush())
 
 def create_progress_bar(current_step: int, total_steps: int = 6) -> str:
     """Создает визуальный прогресс-бар"""
@@ -317,19 +722,24 @@ def create_progress_bar(current_step: int, total_steps: int = 6) -> str:
     empty = "○" * (total_steps - current_step)
     return f"{filled}{empty} {current_step}/{total_steps}"
 
+# Готовые прогресс-бары для всех номеров шагов (индекс - номер шага)
+_PROGRESS_BARS = tuple(create_progress_bar(step) for step in range(7))
+
+# Номера шагов приветственного модуля для прогресс-бара
+STEP_MAPPING = {
+    WelcomeState.STEP_1_GREETING: 1,
+    WelcomeState.STEP_2_ANXIETY_INTRO: 2,
+    WelcomeState.STEP_2_ANXIETY_SURVEY: 2,
+    WelcomeState.STEP_3_GOALS: 3,
+    WelcomeState.STEP_4_NOTIFICATIONS: 4,
+    WelcomeState.STEP_5_AI_MENTOR: 5,
+    WelcomeState.STEP_6_COMPLETION: 6,
+    WelcomeState.COMPLETED: 6
+}
+
 def get_step_number(step: str) -> int:
     """Возвращает номер шага для прогресс-бара"""
-    step_mapping = {
-        WelcomeState.STEP_1_GREETING: 1,
-        WelcomeState.STEP_2_ANXIETY_INTRO: 2,
-        WelcomeState.STEP_2_ANXIETY_SURVEY: 2,
-        WelcomeState.STEP_3_GOALS: 3,
-        WelcomeState.STEP_4_NOTIFICATIONS: 4,
-        WelcomeState.STEP_5_AI_MENTOR: 5,
-        WelcomeState.STEP_6_COMPLETION: 6,
-        WelcomeState.COMPLETED: 6
-    }
-    return step_mapping.get(step, 1)
+    return STEP_MAPPING.get(step, 1)
 
 # Тексты для опросника тревожности
 ANXIETY_QUESTIONS = [
@@ -340,6 +750,22 @@ ANXIETY_QUESTIONS = [
     "Меня легко вывести из равновесия стрессовыми ситуациями"
 ]
 
+# Пороги уровня тревожности (включительно) и подписи соответствующих уровней
+_ANXIETY_THRESHOLDS = (2.0, 3.5)
+_ANXIETY_LABELS = ("низкий 😌", "умеренный 😐", "повышенный 😰")
+_ANXIETY_CONTEXT_LABELS = ("низкий уровень тревожности", "умеренный уровень тревожности", "повышенный уровень тревожности")
+_ANXIETY_RESULTS = (
+    ("Низкий уровень тревожности 😌", "У вас хорошие навыки управления стрессом!"),
+    ("Умеренный уровень тревожности 😐", "Иногда стресс может влиять на вашу работу."),
+    ("Повышенный уровень тревожности 😰", "Трекер поможет вам лучше управлять стрессом."),
+)
+
+@functools.lru_cache(maxsize=128)
+def interpret_anxiety(level: float) -> tuple:
+    """Возвращает (описание уровня, совет, краткую подпись) для уровня тревожности"""
+    bucket = bisect.bisect_left(_ANXIETY_THRESHOLDS, level)
+    return _ANXIETY_RESULTS[bucket] + (_ANXIETY_LABELS[bucket],)
+
 # Доступные цели для выбора
 AVAILABLE_GOALS = [
     "task_management", "stress_reduction", "productivity", "time_organization"
@@ -352,6 +778,9 @@ GOAL_DESCRIPTIONS = {
     "time_organization": "Организация рабочего времени"
 }
 
+# Описания целей в нижнем регистре для текстовых сводок
+_GOAL_LABELS_LC = {goal_id: goal_desc.lower() for goal_id, goal_desc in GOAL_DESCRIPTIONS.items()}
+
 # Описания приоритетов задач
 PRIORITY_DESCRIPTIONS = {
     TaskPriority.LOW: "🟢 Низкий",
@@ -359,6 +788,7 @@ PRIORITY_DESCRIPTIONS = {
     TaskPriority.HIGH: "🟠 Высокий",
     TaskPriority.URGENT: "🔴 Срочный"
 }
+_PRIORITY_ITEMS = tuple(PRIORITY_DESCRIPTIONS.items())
 
 # Описания статусов задач
 STATUS_DESCRIPTIONS = {
@@ -375,6 +805,42 @@ NOTIFICATION_TYPES = {
     "new_task_notifications": "Уведомления о новых задачах"
 }
 
+# Для каждой цели и типа уведомлений две готовые строки клавиатуры:
+# (выключено, включено), выбор делается по булеву значению без сборки кнопок
+_GOAL_ROW_VARIANTS = tuple(
+    (goal_id, tuple(
+        [types.InlineKeyboardButton(text=f"{mark} {goal_desc}", callback_data=f"tracker_goal_toggle_{goal_id}")]
+        for mark in ("☐", "✅")
+    ))
+    for goal_id, goal_desc in GOAL_DESCRIPTIONS.items()
+)
+_NOTIF_ROW_VARIANTS = tuple(
+    (notif_id, tuple(
+        [types.InlineKeyboardButton(text=f"{mark} {notif_desc}", callback_data=f"tracker_notif_toggle_{notif_id}")]
+        for mark in ("☐", "✅")
+    ))
+    for notif_id, notif_desc in NOTIFICATION_TYPES.items()
+)
+
+# Главный переключатель уведомлений: в настройках выключенное состояние отмечается ❌, в шаге 4 - ☐
+_NOTIF_ENABLED_ROWS = tuple(
+    [types.InlineKeyboardButton(text=f"{mark} Включить уведомления", callback_data="tracker_notif_toggle_enabled")]
+    for mark in ("❌", "✅")
+)
+_STEP4_ENABLED_ROWS = (
+    [types.InlineKeyboardButton(text="☐ Включить уведомления", callback_data="tracker_notif_toggle_enabled")],
+    _NOTIF_ENABLED_ROWS[1],
+)
+
+_STEP3_NAV_ROW = [
+    types.InlineKeyboardButton(text="⏮️ Назад", callback_data="tracker_step_2_back"),
+    types.InlineKeyboardButton(text="▶️ Продолжить", callback_data="tracker_step_4_notifications")
+]
+_STEP4_NAV_ROW = [
+    types.InlineKeyboardButton(text="⏮️ Назад", callback_data="tracker_step_3_back"),
+    types.InlineKeyboardButton(text="▶️ Продолжить", callback_data="tracker_step_5_ai_mentor")
+]
+
 # Системный промпт для AI-ментора
 AI_MENTOR_SYSTEM_PROMPT = """Ты - AI-ментор по управлению стрессом и продуктивностью. Твоя роль - помогать пользователям справляться с рабочей тревожностью и эффективно управлять задачами.
 
@@ -405,7 +871,45 @@ AI_MENTOR_SYSTEM_PROMPT = """Ты - AI-ментор по управлению с
 
 При первом знакомстве представься кратко и узнай, с чем именно пользователь хотел бы получить помощь сегодня."""
 
+# Описания уровней продуктивности из дневных саммари
+_PRODUCTIVITY_DESCRIPTIONS = {"low": "низкая", "medium": "средняя", "high": "высокая"}
+
+# Последний построенный контекст AI-ментора по пользователям: user_id -> (отпечаток, текст)
+MENTOR_CONTEXT_CACHE_MAX = 1024
+_mentor_context_cache: "OrderedDict[int, tuple]" = OrderedDict()
+
+def _mentor_context_fingerprint(user_data: TrackerUserData) -> tuple:
+    """Собирает все данные, от которых зависит текст контекста AI-ментора"""
+    active_tasks = iter_active_tasks(user_data)
+    summaries = user_data.daily_summaries
+    return (
+        user_data.anxiety_level,
+        tuple(user_data.goals),
+        user_data.timezone,
+        len(user_data.tasks),
+        get_task_count(user_data, TaskStatus.PENDING),
+        get_task_count(user_data, TaskStatus.IN_PROGRESS),
+        get_task_count(user_data, TaskStatus.COMPLETED),
+        tuple((task.title, task.priority, task.status, task.due_date) for task in itertools.islice(active_tasks, 5)),
+        len(summaries),
+        summaries[-1].get('date') if summaries and isinstance(summaries[-1], dict) else None,
+    )
+
 def create_ai_mentor_context(user_data: TrackerUserData) -> str:
+    """Возвращает контекст о пользователе для AI-ментора, пересобирая его только при изменениях"""
+    fingerprint = _mentor_context_fingerprint(user_data)
+    cached = _mentor_context_cache.get(user_data.user_id)
+    if cached is not None and cached[0] == fingerprint:
+        return cached[1]
+    
+    context = _build_ai_mentor_context(user_data)
+    _mentor_context_cache[user_data.user_id] = (fingerprint, context)
+    _mentor_context_cache.move_to_end(user_data.user_id)
+    if len(_mentor_context_cache) > MENTOR_CONTEXT_CACHE_MAX:
+        _mentor_context_cache.popitem(last=False)
+    return context
+
+def _build_ai_mentor_context(user_data: TrackerUserData) -> str:
     """Создает контекст о пользователе для AI-ментора"""
     context_parts = []
     
@@ -414,44 +918,44 @@ def create_ai_mentor_context(user_data: TrackerUserData) -> str:
     
     # Уровень тревожности
     if user_data.anxiety_level:
-        if user_data.anxiety_level <= 2.0:
-            anxiety_desc = "низкий уровень тревожности"
-        elif user_data.anxiety_level <= 3.5:
-            anxiety_desc = "умеренный уровень тревожности"
-        else:
-            anxiety_desc = "повышенный уровень тревожности"
+        anxiety_desc = _ANXIETY_CONTEXT_LABELS[bisect.bisect_left(_ANXIETY_THRESHOLDS, user_data.anxiety_level)]
         context_parts.append(f"Уровень тревожности: {anxiety_desc} ({user_data.anxiety_level}/5.0).")
     
     # Цели пользователя
     if user_data.goals:
-        goal_descriptions = [GOAL_DESCRIPTIONS[goal] for goal in user_data.goals if goal in GOAL_DESCRIPTIONS]
-        if goal_descriptions:
-            context_parts.append(f"Основные цели: {', '.join(goal_descriptions).lower()}.")
+        context_parts.append(f"Основные цели: {', '.join(_GOAL_LABELS_LC[goal] for goal in user_data.goals)}.")
     
     # Информация о задачах
     if user_data.tasks:
-        # Статистика задач
-        pending_tasks = get_tasks_by_status(user_data, TaskStatus.PENDING)
-        in_progress_tasks = get_tasks_by_status(user_data, TaskStatus.IN_PROGRESS)
-        completed_tasks = get_tasks_by_status(user_data, TaskStatus.COMPLETED)
+        # Статистика задач берется из индекса по статусам, без обхода списка
+        pending_count = get_task_count(user_data, TaskStatus.PENDING)
+        in_progress_count = get_task_count(user_data, TaskStatus.IN_PROGRESS)
+        completed_count = get_task_count(user_data, TaskStatus.COMPLETED)
         
-        context_parts.append(f"Всего задач: {len(user_data.tasks)} (ожидают: {len(pending_tasks)}, в работе: {len(in_progress_tasks)}, выполнены: {len(completed_tasks)}).")
+        context_parts.append(f"Всего задач: {len(user_data.tasks)} (ожидают: {pending_count}, в работе: {in_progress_count}, выполнены: {completed_count}).")
         
         # Активные задачи (ожидающие и в работе)
-        active_tasks = pending_tasks + in_progress_tasks
-        if active_tasks:
+        active_count = pending_count + in_progress_count
+        if active_count:
             context_parts.append("Текущие задачи:")
-            for task in active_tasks[:5]:  # Максимум 5 задач для экономии токенов
-                priority_desc = PRIORITY_DESCRIPTIONS.get(task.priority, "обычная")
-                status_desc = STATUS_DESCRIPTIONS.get(task.status, "неизвестно")
+            active_tasks = itertools.chain(
+                user_data._by_status.get(TaskStatus.PENDING, ()),
+                user_data._by_status.get(TaskStatus.IN_PROGRESS, ())
+            )
+            priority_descriptions = PRIORITY_DESCRIPTIONS
+            status_descriptions = STATUS_DESCRIPTIONS
+            user_tz = get_user_timezone(user_data)
+            for task in itertools.islice(active_tasks, 5):  # Максимум 5 задач для экономии токенов
+                priority_desc = priority_descriptions.get(task.priority, "обычная")
+                status_desc = status_descriptions.get(task.status, "неизвестно")
                 due_info = ""
                 if task.due_date:
-                    due_date_str = format_datetime_for_user(task.due_date, user_data)
+                    due_date_str = datetime.fromtimestamp(task.due_date, tz=user_tz).strftime('%d.%m.%Y %H:%M')
                     due_info = f", срок: {due_date_str}"
                 context_parts.append(f"- '{task.title}' ({priority_desc} приоритет, {status_desc}{due_info})")
             
-            if len(active_tasks) > 5:
-                context_parts.append(f"... и еще {len(active_tasks) - 5} задач.")
+            if active_count > 5:
+                context_parts.append(f"... и еще {active_count - 5} задач.")
     else:
         context_parts.append("У пользователя пока нет задач.")
     
@@ -459,13 +963,13 @@ def create_ai_mentor_context(user_data: TrackerUserData) -> str:
     if user_data.daily_summaries:
         context_parts.append("История последних дней:")
         # Показываем последние 5 дней для контекста
-        recent_summaries = user_data.daily_summaries[-5:]
+        recent_summaries = itertools.islice(user_data.daily_summaries, max(0, len(user_data.daily_summaries) - 5), None)
         for summary_dict in recent_summaries:
             if isinstance(summary_dict, dict):
                 date_str = summary_dict.get('date', 'неизвестная дата')
                 summary_text = summary_dict.get('summary_text', '')
                 productivity = summary_dict.get('productivity_level', 'medium')
-                productivity_desc = {"low": "низкая", "medium": "средняя", "high": "высокая"}.get(productivity, productivity)
+                productivity_desc = _PRODUCTIVITY_DESCRIPTIONS.get(productivity, productivity)
                 
                 if summary_text:
                     context_parts.append(f"- {date_str}: {summary_text[:100]}{'...' if len(summary_text) > 100 else ''} (продуктивность: {productivity_desc})")
@@ -479,6 +983,56 @@ def create_ai_mentor_context(user_data: TrackerUserData) -> str:
     
     return " ".join(context_parts)
 
+async def ai_chat_completion(**kwargs):
+    """Запрос к chat completions с ограничением числа одновременных запросов
+    
+    Порядок запросов одного пользователя задают сами обработчики: они ждут
+    ответа перед следующим шагом диалога.
+    """
+    async with _ai_sem:
+        return await client.chat.completions.create(**kwargs)
+
+async def ai_completion_text(on_text=None, **kwargs) -> str:
+    """Возвращает текст ответа chat completions
+    
+    Если передан on_text, ответ читается потоком и on_text вызывается
+    с накопленным на данный момент текстом после каждой новой части.
+    """
+    if on_text is None:
+        response = await ai_chat_completion(**kwargs)
+        return response.choices[0].message.content
+    
+    parts = []
+    progress = asyncio.Event()
+    finished = False
+    
+    async def show_progress():
+        # Правки сообщения идут отдельно от чтения потока: медленная отправка
+        # в Telegram не держит слот _ai_sem и не задерживает запросы других пользователей
+        while True:
+            await progress.wait()
+            progress.clear()
+            if finished:
+                return
+            await on_text("".join(parts))
+    
+    progress_task = asyncio.create_task(show_progress())
+    try:
+        async with _ai_sem:
+            stream = await client.chat.completions.create(stream=True, **kwargs)
+            async for chunk in stream:
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    parts.append(delta)
+                    progress.set()
+    except BaseException:
+        progress_task.cancel()
+        raise
+    finished = True
+    progress.set()
+    await progress_task
+    return "".join(parts)
+
 async def chat_with_ai_mentor(user_data: TrackerUserData, user_message: str) -> str:
     """Отправляет сообщение AI-ментору и получает ответ"""
     try:
@@ -497,7 +1051,7 @@ async def chat_with_ai_mentor(user_data: TrackerUserData, user_message: str) ->
         messages.append({"role": "user", "content": user_message})
         
         # Отправляем запрос к OpenAI
-        response = await client.chat.completions.create(
+        response = await ai_chat_completion(
             model=GPT4_MODEL,
             messages=messages,
             max_tokens=500,
@@ -506,16 +1060,14 @@ async def chat_with_ai_mentor(user_data: TrackerUserData, user_message: str) ->
         
         ai_response = response.choices[0].message.content
         
-        # Сохраняем в историю (только последние 10 сообщений для экономии токенов)
+        # Сохраняем в историю; deque сам отбрасывает сообщения сверх AI_MENTOR_HISTORY_LIMIT
         user_data.ai_mentor_history.append({"role": "user", "content": user_message})
         user_data.ai_mentor_history.append({"role": "assistant", "content": ai_response})
         
-        # Ограничиваем историю 20 сообщениями (10 пар вопрос-ответ)
-        if len(user_data.ai_mentor_history) > 20:
-            user_data.ai_mentor_history = user_data.ai_mentor_history[-20:]
-        
-        user_data.met_ai_mentor = True
-        save_user_data(user_data)
+        if not user_data.met_ai_mentor:
+            user_data.met_ai_mentor = True
+        # Ход диалога меняет только историю и флаг знакомства - остальное не сериализуем
+        save_user_data_later(user_data, fields=("ai_mentor_history", "met_ai_mentor"))
         
         return ai_response
         
@@ -523,43 +1075,80 @@ async def chat_with_ai_mentor(user_data: TrackerUserData, user_message: str) ->
         logger.error(f"Error in AI mentor chat: {e}")
         return "Извините, сейчас у меня проблемы с соединением. Попробуйте чуть позже."
 
+# Глобальный менеджер уведомлений; notifications импортирует tracker,
+# поэтому модуль подключается лениво при первом обращении
+_notification_manager = None
+
+def _get_notification_manager():
+    """Возвращает закешированный менеджер уведомлений"""
+    global _notification_manager
+    if _notification_manager is None:
+        from .notifications import get_notification_manager
+        _notification_manager = get_notification_manager()
+    return _notification_manager
+
+# Ссылки на фоновые задачи уведомлений, чтобы их не собрал сборщик мусора
+_background_tasks: set = set()
+
+def _notify_new_task(user_id: int, title: str):
+    """Отправляет уведомление о новой задаче в фоне, если бот уже подключен"""
+    try:
+        notification_manager = _get_notification_manager()
+        if not notification_manager.bot:
+            return
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        # Вне event loop (скрипты, тесты) уведомления не отправляются
+        return
+    except Exception as e:
+        logger.error(f"Error sending new task notification: {e}")
+        return
+    
+    task = loop.create_task(notification_manager.notify_new_task(user_id, title))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+async def _send_typing(message: types.Message):
+    try:
+        await ChatActions.send_typing(message)
+    except Exception as e:
+        logger.debug(f"Error sending typing action: {e}")
+
+def show_typing(message: types.Message):
+    """Показывает "печатает..." в фоне, не задерживая следующий за ним запрос к AI"""
+    task = asyncio.create_task(_send_typing(message))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
 # === CRUD операции для задач ===
 
 def create_task(user_data: TrackerUserData, title: str, description: str = "", priority: str = TaskPriority.MEDIUM) -> TrackerTask:
     """Создает новую задачу"""
     task = TrackerTask(title, description, priority)
     user_data.tasks.append(task)
-    save_user_data(user_data)
+    _index_task(user_data, task)
+    save_user_data_later(user_data)
     logger.info(f"Created task '{title}' for user {user_data.user_id}")
     
     # Отправляем уведомление о новой задаче (если включены)
-    try:
-        from .notifications import get_notification_manager
-        notification_manager = get_notification_manager()
-        if notification_manager.bot:
-            import asyncio
-            asyncio.create_task(notification_manager.notify_new_task(user_data.user_id, title))
-    except Exception as e:
-        logger.error(f"Error sending new task notification: {e}")
+    _notify_new_task(user_data.user_id, title)
     
     return task
 
 def get_task_by_id(user_data: TrackerUserData, task_id: str) -> Optional[TrackerTask]:
     """Получает задачу по ID"""
-    for task in user_data.tasks:
-        if task.id == task_id:
-            return task
-    return None
+    return user_data._by_id.get(task_id)
 
 def update_task_status(user_data: TrackerUserData, task_id: str, new_status: str) -> bool:
     """Обновляет статус задачи"""
     task = get_task_by_id(user_data, task_id)
     if task:
+        _reindex_task_status(user_data, task, new_status)
         task.status = new_status
-        task.updated_at = int(time.time())
+        task.updated_at = int(request_now())
         if new_status == TaskStatus.COMPLETED:
-            task.completed_at = int(time.time())
-        save_user_data(user_data)
+            task.completed_at = task.updated_at
+        save_user_data_later(user_data)
         logger.info(f"Updated task {task_id} status to {new_status} for user {user_data.user_id}")
         return True
     return False
@@ -568,156 +1157,211 @@ def update_task_priority(user_data: TrackerUserData, task_id: str, new_priority:
     """Обновляет приоритет задачи"""
     task = get_task_by_id(user_data, task_id)
     if task:
+        user_data._by_priority.remove(task)
         task.priority = new_priority
-        task.updated_at = int(time.time())
-        save_user_data(user_data)
+        bisect.insort(user_data._by_priority, task, key=functools.partial(_priority_sort_key, user_data))
+        task.updated_at = int(request_now())
+        save_user_data_later(user_data)
         logger.info(f"Updated task {task_id} priority to {new_priority} for user {user_data.user_id}")
         return True
     return False
 
 def delete_task(user_data: TrackerUserData, task_id: str) -> bool:
     """Удаляет задачу"""
-    for i, task in enumerate(user_data.tasks):
-        if task.id == task_id:
-            removed_task = user_data.tasks.pop(i)
-            save_user_data(user_data)
-            logger.info(f"Deleted task '{removed_task.title}' for user {user_data.user_id}")
-            return True
+    removed_task = user_data._by_id.get(task_id)
+    if removed_task:
+        user_data.tasks.remove(removed_task)
+        _unindex_task(user_data, removed_task)
+        save_user_data_later(user_data)
+        logger.info(f"Deleted task '{removed_task.title}' for user {user_data.user_id}")
+        return True
     return False
 
 def get_tasks_by_status(user_data: TrackerUserData, status: str) -> List[TrackerTask]:
     """Получает задачи по статусу"""
-    return [task for task in user_data.tasks if task.status == status]
+    return list(user_data._by_status.get(status, ()))
 
 def get_tasks_by_priority(user_data: TrackerUserData, priority: str) -> List[TrackerTask]:
     """Получает задачи по приоритету"""
     return [task for task in user_data.tasks if task.priority == priority]
 
+# Порядок сортировки задач: чем больше число, тем выше задача в списке
+_PRIORITY_ORDER = {TaskPriority.URGENT: 4, TaskPriority.HIGH: 3, TaskPriority.MEDIUM: 2, TaskPriority.LOW: 1}
+_STATUS_ORDER = {TaskStatus.IN_PROGRESS: 4, TaskStatus.PENDING: 3, TaskStatus.COMPLETED: 2, TaskStatus.CANCELLED: 1}
+
 def get_tasks_sorted(user_data: TrackerUserData, sort_by: str = "created_at") -> List[TrackerTask]:
     """Получает отсортированные задачи"""
     if sort_by == "priority":
-        priority_order = {TaskPriority.URGENT: 4, TaskPriority.HIGH: 3, TaskPriority.MEDIUM: 2, TaskPriority.LOW: 1}
-        return sorted(user_data.tasks, key=lambda t: (priority_order.get(t.priority, 0), -t.created_at), reverse=True)
+        # Порядок по приоритету поддерживается индексом при изменении задач
+        return list(user_data._by_priority)
     elif sort_by == "status":
-        status_order = {TaskStatus.IN_PROGRESS: 4, TaskStatus.PENDING: 3, TaskStatus.COMPLETED: 2, TaskStatus.CANCELLED: 1}
-        return sorted(user_data.tasks, key=lambda t: (status_order.get(t.status, 0), -t.created_at), reverse=True)
+        rank = _STATUS_ORDER.get
+        return sorted(user_data.tasks, key=lambda t: (rank(t.status, 0), -t.created_at), reverse=True)
     else:  # created_at
         return sorted(user_data.tasks, key=lambda t: t.created_at, reverse=True)
 
 def format_task_text(task: TrackerTask, show_details: bool = False, user_data: TrackerUserData = None) -> str:
     """Форматирует текст задачи для отображения"""
     status_emoji = STATUS_DESCRIPTIONS.get(task.status, "⚪")
-    priority_emoji = PRIORITY_DESCRIPTIONS.get(task.priority, "⚪")
     
-    text = f"{status_emoji} **{task.title}**"
+    parts = [f"{status_emoji} **{task.title}**"]
     
     if show_details:
+        priority_emoji = PRIORITY_DESCRIPTIONS.get(task.priority, "⚪")
         if task.description:
-            text += f"\n📝 {task.description}"
-        text += f"\n🎯 Приоритет: {priority_emoji}"
+            parts.append(f"📝 {task.description}")
+        parts.append(f"🎯 Приоритет: {priority_emoji}")
         
         # Используем пользовательский часовой пояс если доступен
         if user_data:
-            created_time = format_datetime_for_user(task.created_at, user_data)
-            text += f"\n📅 Создана: {created_time}"
-            if task.status == TaskStatus.COMPLETED and task.completed_at:
-                completed_time = format_datetime_for_user(task.completed_at, user_data)
-                text += f"\n✅ Завершена: {completed_time}"
-            if task.due_date:
-                due_time = format_datetime_for_user(task.due_date, user_data)
-                text += f"\n⏰ Дедлайн: {due_time}"
+            format_time = lambda ts: format_datetime_for_user(ts, user_data)
         else:
-            text += f"\n📅 Создана: {datetime.fromtimestamp(task.created_at).strftime('%d.%m.%Y %H:%M')}"
-            if task.status == TaskStatus.COMPLETED and task.completed_at:
-                text += f"\n✅ Завершена: {datetime.fromtimestamp(task.completed_at).strftime('%d.%m.%Y %H:%M')}"
-            if task.due_date:
-                text += f"\n⏰ Дедлайн: {datetime.fromtimestamp(task.due_date).strftime('%d.%m.%Y %H:%M')}"
+            format_time = lambda ts: datetime.fromtimestamp(ts).strftime('%d.%m.%Y %H:%M')
+        
+        parts.append(f"📅 Создана: {format_time(task.created_at)}")
+        if task.status == TaskStatus.COMPLETED and task.completed_at:
+            parts.append(f"✅ Завершена: {format_time(task.completed_at)}")
+        if task.due_date:
+            parts.append(f"⏰ Дедлайн: {format_time(task.due_date)}")
     
-    return text
+    return "\n".join(parts)
 
 # === Функции для работы с часовыми поясами ===
 
+@functools.lru_cache(maxsize=64)
+def resolve_timezone(name: str) -> tzinfo:
+    """Возвращает объект часового пояса по имени (UTC, если пояс неизвестен)"""
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError, OSError):
+        # OSError: имя указывает на каталог базы поясов ("Europe") или слишком длинное
+        logger.warning(f"Unknown timezone '{name}', falling back to UTC")
+        return dt_timezone.utc
+
+def get_user_timezone(user_data: TrackerUserData) -> tzinfo:
+    """Возвращает кешированный часовой пояс пользователя
+    
+    Кеш привязан к имени пояса и сбрасывается сам, если timezone изменился.
+    """
+    cached = user_data._tz_cache
+    if cached is None or cached[0] != user_data.timezone:
+        cached = user_data._tz_cache = (user_data.timezone, resolve_timezone(user_data.timezone))
+    return cached[1]
+
 def get_user_local_time(user_data: TrackerUserData) -> datetime:
     """Получает текущее время в часовом поясе пользователя"""
-    try:
-        user_tz = pytz.timezone(user_data.timezone)
-        return datetime.now(user_tz)
-    except:
-        return datetime.now(pytz.UTC)
+    return datetime.fromtimestamp(request_now(), get_user_timezone(user_data))
 
 def format_datetime_for_user(timestamp: int, user_data: TrackerUserData) -> str:
     """Форматирует timestamp в строку с учетом часового пояса пользователя"""
-    try:
-        user_tz = pytz.timezone(user_data.timezone)
-        dt = datetime.fromtimestamp(timestamp, tz=user_tz)
-        return dt.strftime('%d.%m.%Y %H:%M')
-    except:
-        dt = datetime.fromtimestamp(timestamp, tz=pytz.UTC)
-        return dt.strftime('%d.%m.%Y %H:%M UTC')
+    dt = datetime.fromtimestamp(timestamp, tz=get_user_timezone(user_data))
+    return dt.strftime('%d.%m.%Y %H:%M')
 
 def parse_user_time(time_str: str, user_data: TrackerUserData) -> Optional[int]:
     """Парсит время пользователя в timestamp с учетом часового пояса"""
-    try:
-        user_tz = pytz.timezone(user_data.timezone)
-        
-        # Пробуем разные форматы
-        formats = ['%H:%M', '%d.%m.%Y %H:%M', '%d.%m %H:%M']
-        
-        for fmt in formats:
-            try:
-                if fmt == '%H:%M':
-                    # Только время - используем сегодняшнюю дату
-                    today = get_user_local_time(user_data).date()
-                    parsed_time = datetime.strptime(time_str, fmt).time()
-                    dt = user_tz.localize(datetime.combine(today, parsed_time))
-                else:
-                    # Полная дата и время
-                    dt = user_tz.localize(datetime.strptime(time_str, fmt))
-                
-                return int(dt.timestamp())
-            except ValueError:
-                continue
-        
-        return None
-    except:
-        return None
+    user_tz = get_user_timezone(user_data)
+    
+    # Пробуем разные форматы
+    formats = ['%H:%M', '%d.%m.%Y %H:%M', '%d.%m %H:%M']
+    
+    for fmt in formats:
+        try:
+            if fmt == '%H:%M':
+                # Только время - используем сегодняшнюю дату
+                today = get_user_local_time(user_data).date()
+                parsed_time = datetime.strptime(time_str, fmt).time()
+                dt = datetime.combine(today, parsed_time, tzinfo=user_tz)
+            else:
+                # Полная дата и время
+                dt = datetime.strptime(time_str, fmt).replace(tzinfo=user_tz)
+            
+            return int(dt.timestamp())
+        except ValueError:
+            continue
+    
+    return None
+
+# Популярные часовые пояса для выбора в настройках
+COMMON_TIMEZONES: Dict[str, str] = {
+    "Europe/Moscow": "🇷🇺 Москва (UTC+3)",
+    "Europe/Kiev": "🇺🇦 Киев (UTC+2)",
+    "Europe/Minsk": "🇧🇾 Минск (UTC+3)",
+    "Asia/Almaty": "🇰🇿 Алматы (UTC+6)",
+    "Asia/Tashkent": "🇺🇿 Ташкент (UTC+5)",
+    "Asia/Yerevan": "🇦🇲 Ереван (UTC+4)",
+    "Asia/Baku": "🇦🇿 Баку (UTC+4)",
+    "Europe/London": "🇬🇧 Лондон (UTC+0)",
+    "Europe/Berlin": "🇩🇪 Берлин (UTC+1)",
+    "America/New_York": "🇺🇸 Нью-Йорк (UTC-5)",
+    "Asia/Tokyo": "🇯🇵 Токио (UTC+9)",
+    "UTC": "🌍 UTC (Всемирное время)"
+}
+_COMMON_TZ_ITEMS = tuple(COMMON_TIMEZONES.items())
 
 def get_common_timezones() -> Dict[str, str]:
     """Возвращает список популярных часовых поясов"""
-    return {
-        "Europe/Moscow": "🇷🇺 Москва (UTC+3)",
-        "Europe/Kiev": "🇺🇦 Киев (UTC+2)",
-        "Europe/Minsk": "🇧🇾 Минск (UTC+3)",
-        "Asia/Almaty": "🇰🇿 Алматы (UTC+6)",
-        "Asia/Tashkent": "🇺🇿 Ташкент (UTC+5)",
-        "Asia/Yerevan": "🇦🇲 Ереван (UTC+4)",
-        "Asia/Baku": "🇦🇿 Баку (UTC+4)",
-        "Europe/London": "🇬🇧 Лондон (UTC+0)",
-        "Europe/Berlin": "🇩🇪 Берлин (UTC+1)",
-        "America/New_York": "🇺🇸 Нью-Йорк (UTC-5)",
-        "Asia/Tokyo": "🇯🇵 Токио (UTC+9)",
-        "UTC": "🌍 UTC (Всемирное время)"
-    }
+    return COMMON_TIMEZONES
+
+# Простое определение часового пояса по языку системной локали
+_LOCALE_TIMEZONES = {
+    'ru_RU': 'Europe/Moscow',
+    'uk_UA': 'Europe/Kiev',
+    'be_BY': 'Europe/Minsk',
+    'kk_KZ': 'Asia/Almaty',
+    'uz_UZ': 'Asia/Tashkent'
+}
 
+@functools.lru_cache(maxsize=1)
 def detect_timezone_from_locale() -> str:
-    """Пытается определить часовой пояс по системной локали"""
+    """Пытается определить часовой пояс по системной локали (один раз за процесс)"""
     try:
         import locale
         lang = locale.getdefaultlocale()[0]
-        
-        # Простое определение по языку
-        timezone_map = {
-            'ru_RU': 'Europe/Moscow',
-            'uk_UA': 'Europe/Kiev',
-            'be_BY': 'Europe/Minsk',
-            'kk_KZ': 'Asia/Almaty',
-            'uz_UZ': 'Asia/Tashkent'
-        }
-        
-        return timezone_map.get(lang, 'UTC')
-    except:
+        return _LOCALE_TIMEZONES.get(lang, 'UTC')
+    except ValueError:
+        # getdefaultlocale не смог разобрать переменные окружения
         return 'UTC'
 
+# === Схлопывание повторных отрисовок ===
+
+def _keyboard_signature(markup: Optional[types.InlineKeyboardMarkup]) -> tuple:
+    """Сравнимое представление inline-клавиатуры"""
+    if markup is None:
+        return ()
+    return tuple(tuple((button.text, button.callback_data) for button in row) for row in markup.inline_keyboard)
+
+def is_unchanged_render(message: types.Message, text: Optional[str], keyboard: types.InlineKeyboardMarkup) -> bool:
+    """Проверяет, что сообщение уже показывает этот текст и клавиатуру, и запоминает отрисовку
+    
+    Отпечаток сверяется с клавиатурой, пришедшей вместе с сообщением: если сообщение
+    успели отредактировать другим экраном, повторная отрисовка не пропускается.
+    """
+    keyboard_sig = _keyboard_signature(keyboard)
+    fingerprint = hash((text, keyboard_sig))
+    key = (message.chat.id, message.message_id)
+    if _render_fingerprints.get(key) == fingerprint and _keyboard_signature(message.reply_markup) == keyboard_sig:
+        return True
+    _render_fingerprints[key] = fingerprint
+    _render_fingerprints.move_to_end(key)
+    if len(_render_fingerprints) > RENDER_FINGERPRINTS_MAX:
+        _render_fingerprints.popitem(last=False)
+    return False
+
+def coalesce_renders(render):
+    """Схлопывает одинаковые отрисовки экрана, пока первая из них еще выполняется"""
+    @functools.wraps(render)
+    async def wrapper(message: types.Message, user_data: TrackerUserData, *args, **kwargs):
+        key = (user_data.user_id, message.message_id, render.__name__, args, tuple(sorted(kwargs.items())))
+        if key in _renders_in_flight:
+            logger.debug(f"Skipped duplicate render {render.__name__} for user {user_data.user_id}")
+            return
+        _renders_in_flight.add(key)
+        try:
+            await render(message, user_data, *args, **kwargs)
+        finally:
+            _renders_in_flight.discard(key)
+    return wrapper
+
 async def process_tracker_message(message: types.Message):
     """Основная функция обработки сообщений в режиме трекера"""
     user_id = message.from_user.id
@@ -733,285 +1377,274 @@ async def process_tracker_message(message: types.Message):
     # Обработка приветственного модуля
     await handle_welcome_module(message, user_data)
 
-async def process_tracker_callback(callback_query: types.CallbackQuery):
-    """Обработка callback-запросов от inline-кнопок трекера"""
-    user_id = callback_query.from_user.id
-    data = callback_query.data
-    user_data = get_user_data(user_id)
-    
-    logger.info(f"Processing tracker callback for user {user_id}, data: {data}")
-    
-    await callback_query.answer()  # Убираем "loading" состояние кнопки
-    
-    # Обработка различных callback-запросов
-    if data == "tracker_step_1_next":
-        user_data.step = WelcomeState.STEP_2_ANXIETY_INTRO
-        save_user_data(user_data)
-        await show_step_2_anxiety_intro(callback_query.message, user_data)
-    
-    elif data == "tracker_anxiety_start":
-        user_data.step = WelcomeState.STEP_2_ANXIETY_SURVEY
-        user_data.anxiety_answers = []  # Сбрасываем предыдущие ответы
-        save_user_data(user_data)
-        await handle_anxiety_survey(callback_query.message, user_data)
-    
-    elif data == "tracker_anxiety_skip":
-        user_data.step = WelcomeState.STEP_3_GOALS
-        save_user_data(user_data)
-        await show_step_3_goals(callback_query.message, user_data)
-    
-    elif data.startswith("tracker_anxiety_answer_"):
-        # Парсим данные: tracker_anxiety_answer_{question_num}_{score}
-        parts = data.split("_")
-        question_num = int(parts[3])
-        score = int(parts[4])
-        
-        # Расширяем массив ответов при необходимости
-        while len(user_data.anxiety_answers) <= question_num:
-            user_data.anxiety_answers.append(0)
-        
-        user_data.anxiety_answers[question_num] = score
-        save_user_data(user_data)
-        
-        # Показываем следующий вопрос
-        await show_anxiety_question(callback_query.message, user_data, question_num + 1)
+def _seen_callback(key: tuple) -> bool:
+    """Проверяет, обрабатывался ли callback недавно, и запоминает его"""
+    now = time.monotonic()
+    # Записи упорядочены по времени - удаляем устаревшие с начала
+    while _processed_callbacks:
+        oldest_ts = next(iter(_processed_callbacks.values()))
+        if now - oldest_ts < CALLBACK_DEDUP_TTL:
+            break
+        _processed_callbacks.popitem(last=False)
+    
+    if key in _processed_callbacks:
+        return True
     
-    elif data.startswith("tracker_anxiety_back_"):
-        # Возврат к предыдущему вопросу
-        parts = data.split("_")
-        question_num = int(parts[3])
-        
-        if question_num > 0:
-            await show_anxiety_question(callback_query.message, user_data, question_num - 1)
-        else:
-            # Возврат к введению опросника
-            await show_step_2_anxiety_intro(callback_query.message, user_data)
-    
-    elif data == "tracker_step_3_goals":
-        user_data.step = WelcomeState.STEP_3_GOALS
-        save_user_data(user_data)
-        await show_step_3_goals(callback_query.message, user_data)
-    
-    elif data.startswith("tracker_goal_toggle_"):
-        # Переключение выбора цели
-        goal_id = data.replace("tracker_goal_toggle_", "")
-        if goal_id in user_data.goals:
-            user_data.goals.remove(goal_id)
-        else:
-            user_data.goals.append(goal_id)
-        save_user_data(user_data)
-        await show_step_3_goals(callback_query.message, user_data)
-    
-    elif data == "tracker_step_2_back":
-        # Возврат к шагу 2 (опросник тревожности)
-        user_data.step = WelcomeState.STEP_2_ANXIETY_INTRO
-        save_user_data(user_data)
+    _processed_callbacks[key] = now
+    if len(_processed_callbacks) > CALLBACK_DEDUP_MAX:
+        _processed_callbacks.popitem(last=False)
+    return False
+
+# === Обработчики callback-запросов ===
+# Каждый обработчик получает callback, данные пользователя и хвост callback_data
+# после префикса (для точных совпадений - пустую строку)
+
+def _step_transition(step: str, show, flush: bool = False):
+    """Создает обработчик перехода на шаг приветственного модуля
+    
+    Шаг записывается через отложенную очередь; с flush=True изменения
+    сбрасываются на диск сразу после показа экрана.
+    """
+    async def handler(callback_query: types.CallbackQuery, user_data: TrackerUserData, arg: str):
+        user_data.step = step
+        save_user_data_later(user_data, fields=("step",))
+        await show(callback_query.message, user_data)
+        if flush:
+            await flush_now()
+    return handler
+
+def _screen(show):
+    """Создает обработчик, который просто показывает экран"""
+    async def handler(callback_query: types.CallbackQuery, user_data: TrackerUserData, arg: str):
+        await show(callback_query.message, user_data)
+    return handler
+
+async def _h_anxiety_start(callback_query: types.CallbackQuery, user_data: TrackerUserData, arg: str):
+    user_data.step = WelcomeState.STEP_2_ANXIETY_SURVEY
+    user_data.anxiety_answers = [0] * len(ANXIETY_QUESTIONS)  # Сбрасываем предыдущие ответы
+    save_user_data_later(user_data, fields=("step", "anxiety_answers"))
+    await handle_anxiety_survey(callback_query.message, user_data)
+
+async def _h_anxiety_answer(callback_query: types.CallbackQuery, user_data: TrackerUserData, arg: str):
+    # Формат: tracker_anxiety_answer_{question_num}_{score}
+    question, score = arg.split("_")
+    question_num = int(question)
+    
+    answers = user_data.anxiety_answers
+    if question_num >= len(answers):
+        # Ответы, начатые до предвыделения списка, дополняем одним расширением
+        logger.warning(f"Anxiety answer {question_num} out of range for user {user_data.user_id}")
+        answers.extend([0] * (question_num + 1 - len(answers)))
+    
+    answers[question_num] = int(score)
+    save_user_data_later(user_data, fields=("anxiety_answers",))
+    
+    # Показываем следующий вопрос
+    await show_anxiety_question(callback_query.message, user_data, question_num + 1)
+
+async def _h_anxiety_back(callback_query: types.CallbackQuery, user_data: TrackerUserData, arg: str):
+    # Возврат к предыдущему вопросу
+    question_num = int(arg)
+    
+    if question_num > 0:
+        await show_anxiety_question(callback_query.message, user_data, question_num - 1)
+    else:
+        # Возврат к введению опросника
         await show_step_2_anxiety_intro(callback_query.message, user_data)
+
+async def _h_goal_toggle(callback_query: types.CallbackQuery, user_data: TrackerUserData, goal_id: str):
+    # Переключение выбора цели; в список попадают только известные цели
+    if goal_id in user_data.goals:
+        user_data.goals.remove(goal_id)
+    elif goal_id not in GOAL_DESCRIPTIONS:
+        logger.warning(f"Unknown goal id {goal_id!r} from user {user_data.user_id}")
+        return
+    else:
+        user_data.goals.append(goal_id)
+    save_user_data_later(user_data, fields=("goals",))
+    # Текст экрана не меняется - обновляем только клавиатуру
+    await show_step_3_goals(callback_query.message, user_data, keyboard_only=True)
+
+async def _h_notif_toggle(callback_query: types.CallbackQuery, user_data: TrackerUserData, notif_id: str):
+    # Переключение настройки уведомлений
+    current_value = user_data.notifications.get(notif_id, False)
+    user_data.notifications[notif_id] = not current_value
+    save_user_data_later(user_data, fields=("notifications",))
+    # Текст экрана не меняется - обновляем только клавиатуру того экрана,
+    # с которого пришло нажатие
+    if user_data.completed:
+        await show_notification_settings(callback_query.message, user_data, keyboard_only=True)
+    else:
+        await show_step_4_notifications(callback_query.message, user_data, keyboard_only=True)
+
+_MEET_AI_MENTOR_KEYBOARD = types.InlineKeyboardMarkup(inline_keyboard=[
+    [types.InlineKeyboardButton(text="▶️ Завершить настройку", callback_data="tracker_step_6_completion")]
+])
+
+async def _h_meet_ai_mentor(callback_query: types.CallbackQuery, user_data: TrackerUserData, arg: str):
+    await initiate_ai_mentor_chat(callback_query.message, user_data)
+
+async def _h_ai_mentor_continue(callback_query: types.CallbackQuery, user_data: TrackerUserData, arg: str):
+    # Переключаемся в режим общения с AI-ментором
+    text = (
+        f"💬 **Общение с AI-ментором**\n\n"
+        f"Теперь вы можете задать любой вопрос AI-ментору. "
+        f"Он сохранит контекст разговора и будет помнить вашу ситуацию.\n\n"
+        f"Просто напишите сообщение, и он ответит!"
+    )
     
-    elif data == "tracker_step_4_notifications":
-        user_data.step = WelcomeState.STEP_4_NOTIFICATIONS
-        save_user_data(user_data)
-        await show_step_4_notifications(callback_query.message, user_data)
-    
-    elif data.startswith("tracker_notif_toggle_"):
-        # Переключение настройки уведомлений
-        notif_id = data.replace("tracker_notif_toggle_", "")
-        current_value = user_data.notifications.get(notif_id, False)
-        user_data.notifications[notif_id] = not current_value
-        save_user_data(user_data)
-        await show_step_4_notifications(callback_query.message, user_data)
-    
-    elif data == "tracker_step_3_back":
-        # Возврат к шагу 3 (выбор целей)
-        user_data.step = WelcomeState.STEP_3_GOALS
-        save_user_data(user_data)
-        await show_step_3_goals(callback_query.message, user_data)
-    
-    elif data == "tracker_step_4_back":
-        # Возврат к шагу 4 (уведомления)
-        user_data.step = WelcomeState.STEP_4_NOTIFICATIONS
-        save_user_data(user_data)
-        await show_step_4_notifications(callback_query.message, user_data)
-    
-    elif data == "tracker_step_5_ai_mentor":
-        user_data.step = WelcomeState.STEP_5_AI_MENTOR
-        save_user_data(user_data)
-        await show_step_5_ai_mentor(callback_query.message, user_data)
-    
-    elif data == "tracker_meet_ai_mentor":
-        await initiate_ai_mentor_chat(callback_query.message, user_data)
-    
-    elif data == "tracker_ai_mentor_continue":
-        # Переключаемся в режим общения с AI-ментором
-        text = (
-            f"💬 **Общение с AI-ментором**\n\n"
-            f"Теперь вы можете задать любой вопрос AI-ментору. "
-            f"Он сохранит контекст разговора и будет помнить вашу ситуацию.\n\n"
-            f"Просто напишите сообщение, и он ответит!"
+    await callback_query.message.edit_text(text, reply_markup=_MEET_AI_MENTOR_KEYBOARD, parse_mode="Markdown")
+
+async def _h_cancel_creation(callback_query: types.CallbackQuery, user_data: TrackerUserData, arg: str):
+    user_data.current_view = "main"
+    save_user_data_later(user_data, fields=("current_view",))
+    await show_main_menu(callback_query.message, user_data)
+
+async def _h_task_detail(callback_query: types.CallbackQuery, user_data: TrackerUserData, task_id: str):
+    await show_task_detail(callback_query.message, user_data, task_id)
+
+_TASK_STARTED_BANNER = "▶️ **Задача взята в работу!**\n\nУдачи в выполнении! AI-ментор всегда готов помочь советом."
+
+async def _h_start_task(callback_query: types.CallbackQuery, user_data: TrackerUserData, task_id: str):
+    if update_task_status(user_data, task_id, TaskStatus.IN_PROGRESS):
+        await show_task_detail(callback_query.message, user_data, task_id, banner=_TASK_STARTED_BANNER)
+    else:
+        await callback_query.message.edit_text("❌ Ошибка при обновлении задачи", parse_mode="Markdown")
+
+async def _h_complete_task(callback_query: types.CallbackQuery, user_data: TrackerUserData, task_id: str):
+    if update_task_status(user_data, task_id, TaskStatus.COMPLETED):
+        task = get_task_by_id(user_data, task_id)
+        # Поздравление и список задач - разные сообщения, отправляем их параллельно
+        await asyncio.gather(
+            callback_query.message.edit_text(
+                f"✅ **Поздравляем!**\n\nЗадача '{task.title if task else 'Неизвестная'}' успешно завершена!",
+                parse_mode="Markdown"
+            ),
+            show_tasks_menu(callback_query.message, user_data)
         )
-        
+    else:
+        await callback_query.message.edit_text("❌ Ошибка при обновлении задачи", parse_mode="Markdown")
+
+async def _h_reset_task(callback_query: types.CallbackQuery, user_data: TrackerUserData, task_id: str):
+    # Пауза и повторное открытие одинаково возвращают задачу в ожидание
+    if update_task_status(user_data, task_id, TaskStatus.PENDING):
+        await show_task_detail(callback_query.message, user_data, task_id)
+    else:
+        await callback_query.message.edit_text("❌ Ошибка при обновлении задачи", parse_mode="Markdown")
+
+async def _h_delete_task(callback_query: types.CallbackQuery, user_data: TrackerUserData, task_id: str):
+    task = get_task_by_id(user_data, task_id)
+    if task:
+        text = f"🗑️ **Удаление задачи**\n\n{format_task_text(task, show_details=True, user_data=user_data)}\n\nВы уверены, что хотите удалить эту задачу?"
         keyboard = types.InlineKeyboardMarkup(inline_keyboard=[
-            [types.InlineKeyboardButton(text="▶️ Завершить настройку", callback_data="tracker_step_6_completion")]
+            [
+                types.InlineKeyboardButton(text="✅ Да, удалить", callback_data=f"tracker_confirm_delete_{task_id}"),
+                types.InlineKeyboardButton(text="❌ Отмена", callback_data=f"tracker_task_detail_{task_id}")
+            ]
         ])
-        
         await callback_query.message.edit_text(text, reply_markup=keyboard, parse_mode="Markdown")
-    
-    elif data == "tracker_step_6_completion":
-        user_data.step = WelcomeState.STEP_6_COMPLETION
-        save_user_data(user_data)
-        await show_step_6_completion(callback_query.message, user_data)
-    
-    elif data == "tracker_start_main":
-        # Переходим к основному функционалу трекера
-        await show_main_menu(callback_query.message, user_data)
-    
-    # === Обработка новых callback для управления задачами ===
-    
-    elif data == "tracker_main_menu":
-        await show_main_menu(callback_query.message, user_data)
-    
-    elif data == "tracker_show_tasks":
-        await show_tasks_menu(callback_query.message, user_data)
-    
-    elif data == "tracker_new_task":
-        await start_task_creation(callback_query.message, user_data)
-    
-    elif data == "tracker_cancel_creation":
-        user_data.current_view = "main"
-        save_user_data(user_data)
-        await show_main_menu(callback_query.message, user_data)
-    
-    elif data.startswith("tracker_task_detail_"):
-        task_id = data.replace("tracker_task_detail_", "")
-        await show_task_detail(callback_query.message, user_data, task_id)
-    
-    elif data.startswith("tracker_start_task_"):
-        task_id = data.replace("tracker_start_task_", "")
-        if update_task_status(user_data, task_id, TaskStatus.IN_PROGRESS):
-            await callback_query.message.edit_text(
-                "▶️ **Задача взята в работу!**\n\nУдачи в выполнении! AI-ментор всегда готов помочь советом.",
-                parse_mode="Markdown"
-            )
-            await show_task_detail(callback_query.message, user_data, task_id)
-        else:
-            await callback_query.message.edit_text("❌ Ошибка при обновлении задачи", parse_mode="Markdown")
-    
-    elif data.startswith("tracker_complete_task_"):
-        task_id = data.replace("tracker_complete_task_", "")
-        if update_task_status(user_data, task_id, TaskStatus.COMPLETED):
-            task = get_task_by_id(user_data, task_id)
-            await callback_query.message.edit_text(
-                f"✅ **Поздравляем!**\n\nЗадача '{task.title if task else 'Неизвестная'}' успешно завершена!",
-                parse_mode="Markdown"
-            )
-            await show_tasks_menu(callback_query.message, user_data)
-        else:
-            await callback_query.message.edit_text("❌ Ошибка при обновлении задачи", parse_mode="Markdown")
-    
-    elif data.startswith("tracker_pause_task_"):
-        task_id = data.replace("tracker_pause_task_", "")
-        if update_task_status(user_data, task_id, TaskStatus.PENDING):
-            await show_task_detail(callback_query.message, user_data, task_id)
-        else:
-            await callback_query.message.edit_text("❌ Ошибка при обновлении задачи", parse_mode="Markdown")
-    
-    elif data.startswith("tracker_reopen_task_"):
-        task_id = data.replace("tracker_reopen_task_", "")
-        if update_task_status(user_data, task_id, TaskStatus.PENDING):
-            await show_task_detail(callback_query.message, user_data, task_id)
-        else:
-            await callback_query.message.edit_text("❌ Ошибка при обновлении задачи", parse_mode="Markdown")
-    
-    elif data.startswith("tracker_delete_task_"):
-        task_id = data.replace("tracker_delete_task_", "")
-        task = get_task_by_id(user_data, task_id)
-        if task:
-            text = f"🗑️ **Удаление задачи**\n\n{format_task_text(task, show_details=True, user_data=user_data)}\n\nВы уверены, что хотите удалить эту задачу?"
-            keyboard = types.InlineKeyboardMarkup(inline_keyboard=[
-                [
-                    types.InlineKeyboardButton(text="✅ Да, удалить", callback_data=f"tracker_confirm_delete_{task_id}"),
-                    types.InlineKeyboardButton(text="❌ Отмена", callback_data=f"tracker_task_detail_{task_id}")
-                ]
-            ])
-            await callback_query.message.edit_text(text, reply_markup=keyboard, parse_mode="Markdown")
-    
-    elif data.startswith("tracker_confirm_delete_"):
-        task_id = data.replace("tracker_confirm_delete_", "")
-        task = get_task_by_id(user_data, task_id)
-        task_title = task.title if task else "Неизвестная"
-        if delete_task(user_data, task_id):
-            await callback_query.message.edit_text(
+
+async def _h_confirm_delete(callback_query: types.CallbackQuery, user_data: TrackerUserData, task_id: str):
+    task = get_task_by_id(user_data, task_id)
+    task_title = task.title if task else "Неизвестная"
+    if delete_task(user_data, task_id):
+        await asyncio.gather(
+            callback_query.message.edit_text(
                 f"🗑️ **Задача удалена**\n\nЗадача '{task_title}' была успешно удалена.",
                 parse_mode="Markdown"
-            )
-            await show_tasks_menu(callback_query.message, user_data)
-        else:
-            await callback_query.message.edit_text("❌ Ошибка при удалении задачи", parse_mode="Markdown")
-    
-    elif data.startswith("tracker_edit_priority_"):
-        task_id = data.replace("tracker_edit_priority_", "")
-        await show_priority_selection(callback_query.message, user_data, task_id)
-    
-    elif data.startswith("tracker_set_priority_"):
-        # Формат: tracker_set_priority_{task_id}_{priority}
-        parts = data.replace("tracker_set_priority_", "").split("_", 1)
-        if len(parts) == 2:
-            task_id, priority = parts
-            if update_task_priority(user_data, task_id, priority):
-                await show_task_detail(callback_query.message, user_data, task_id)
-            else:
-                await callback_query.message.edit_text("❌ Ошибка при обновлении приоритета", parse_mode="Markdown")
-    
-    elif data == "tracker_ai_mentor_chat":
-        text = (
-            f"🤖 **AI-ментор готов помочь!**\n\n"
-            f"Просто напишите ваш вопрос, и я передам его AI-ментору. "
-            f"Он поможет с планированием, управлением стрессом и повышением продуктивности."
+            ),
+            show_tasks_menu(callback_query.message, user_data)
         )
-        keyboard = types.InlineKeyboardMarkup(inline_keyboard=[
-            [types.InlineKeyboardButton(text="⬅️ Главное меню", callback_data="tracker_main_menu")]
-        ])
-        await callback_query.message.edit_text(text, reply_markup=keyboard, parse_mode="Markdown")
-    
-    elif data == "tracker_settings":
-        await show_settings_menu(callback_query.message, user_data)
-    
-    elif data.startswith("tracker_filter_"):
-        filter_type = data.replace("tracker_filter_", "")
-        await show_filtered_tasks(callback_query.message, user_data, filter_type)
-    
-    # === Обработка настроек ===
-    
-    elif data == "tracker_settings_notifications":
-        await show_notification_settings(callback_query.message, user_data)
-    
-    elif data == "tracker_settings_timezone":
-        await show_timezone_settings(callback_query.message, user_data)
-    
-    elif data.startswith("tracker_set_timezone_"):
-        timezone = data.replace("tracker_set_timezone_", "")
-        user_data.timezone = timezone
-        save_user_data(user_data)
-        await show_timezone_settings(callback_query.message, user_data)
-    
-    elif data == "tracker_test_digest":
-        # Отправляем тестовый дайджест
+    else:
+        await callback_query.message.edit_text("❌ Ошибка при удалении задачи", parse_mode="Markdown")
+
+async def _h_edit_priority(callback_query: types.CallbackQuery, user_data: TrackerUserData, task_id: str):
+    await show_priority_selection(callback_query.message, user_data, task_id)
+
+async def _h_set_priority(callback_query: types.CallbackQuery, user_data: TrackerUserData, arg: str):
+    # Формат: tracker_set_priority_{task_id}_{priority}
+    parts = arg.rsplit("_", 1)
+    if len(parts) == 2:
+        task_id, priority = parts
+        if update_task_priority(user_data, task_id, priority):
+            await show_task_detail(callback_query.message, user_data, task_id)
+        else:
+            await callback_query.message.edit_text("❌ Ошибка при обновлении приоритета", parse_mode="Markdown")
+
+_AI_MENTOR_CHAT_KEYBOARD = types.InlineKeyboardMarkup(inline_keyboard=[
+    [types.InlineKeyboardButton(text="⬅️ Главное меню", callback_data="tracker_main_menu")]
+])
+
+async def _h_ai_mentor_chat(callback_query: types.CallbackQuery, user_data: TrackerUserData, arg: str):
+    text = (
+        f"🤖 **AI-ментор готов помочь!**\n\n"
+        f"Просто напишите ваш вопрос, и я передам его AI-ментору. "
+        f"Он поможет с планированием, управлением стрессом и повышением продуктивности."
+    )
+    await callback_query.message.edit_text(text, reply_markup=_AI_MENTOR_CHAT_KEYBOARD, parse_mode="Markdown")
+
+async def _h_filter(callback_query: types.CallbackQuery, user_data: TrackerUserData, filter_type: str):
+    await show_filtered_tasks(callback_query.message, user_data, filter_type)
+
+async def _h_set_timezone(callback_query: types.CallbackQuery, user_data: TrackerUserData, timezone: str):
+    # Сохраняем только пояса из списка выбора: имя приходит из данных callback
+    if timezone not in COMMON_TIMEZONES:
+        logger.warning(f"Unknown timezone {timezone!r} from user {user_data.user_id}")
+        return
+    user_data.timezone = timezone
+    save_user_data_later(user_data, fields=("timezone",))
+    await show_timezone_settings(callback_query.message, user_data)
+
+# Пользователи, для которых тестовый дайджест уже отправляется
+_digests_in_flight: set = set()
+
+async def _send_test_digest(message: types.Message, user_id: int):
+    """Отправляет тестовый дайджест в фоне и сообщает об ошибке отдельным сообщением"""
+    try:
+        await _get_notification_manager().send_manual_digest(user_id)
+    except Exception as e:
+        logger.error(f"Error sending test digest: {e}")
         try:
-            from .notifications import get_notification_manager
-            notification_manager = get_notification_manager()
-            await notification_manager.send_manual_digest(user_data.user_id)
-            await callback_query.answer("📬 Тестовый дайджест отправлен!")
+            await message.answer("❌ Ошибка отправки дайджеста")
         except Exception as e:
-            logger.error(f"Error sending test digest: {e}")
-            await callback_query.answer("❌ Ошибка отправки дайджеста")
+            logger.error(f"Error reporting test digest failure: {e}")
+    finally:
+        _digests_in_flight.discard(user_id)
+
+async def _h_test_digest(callback_query: types.CallbackQuery, user_data: TrackerUserData, arg: str):
+    # Дайджест может состоять из нескольких сообщений - отправляем его в фоне,
+    # повторные нажатия во время отправки игнорируем
+    user_id = user_data.user_id
+    if user_id in _digests_in_flight:
+        return
+    _digests_in_flight.add(user_id)
+    task = asyncio.create_task(_send_test_digest(callback_query.message, user_id))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+async def process_tracker_callback(callback_query: types.CallbackQuery):
+    """Обработка callback-запросов от inline-кнопок трекера"""
+    user_id = callback_query.from_user.id
+    data = callback_query.data
+    user_data = get_user_data(user_id)
+    
+    logger.info(f"Processing tracker callback for user {user_id}, data: {data}")
     
-    # === Обработка вечернего трекера ===
+    await callback_query.answer()  # Убираем "loading" состояние кнопки
+    
+    if data in _DEDUP_CALLBACKS and _seen_callback((user_id, data, callback_query.message.message_id)):
+        logger.info(f"Ignored repeated callback {data} for user {user_id}")
+        return
     
-    elif data == "tracker_evening_tracker":
-        await show_evening_tracker_start(callback_query.message, user_data)
+    handler = EXACT_HANDLERS.get(data)
+    if handler is not None:
+        await handler(callback_query, user_data, "")
+        return
     
-    elif data == "tracker_evening_start":
-        await start_evening_tracking_session(callback_query.message, user_data)
+    # Один проход регулярного выражения вместо цепочки startswith/replace
+    match = _PREFIX_RE.match(data)
+    if match is not None:
+        await PREFIX_HANDLERS[match.group(1)](callback_query, user_data, data[match.end():])
 
 async def show_priority_selection(message: types.Message, user_data: TrackerUserData, task_id: str):
     """Показывает меню выбора приоритета"""
@@ -1027,13 +1660,13 @@ async def show_priority_selection(message: types.Message, user_data: TrackerUser
         f"Выберите новый приоритет:"
     )
     
-    keyboard_rows = []
-    for priority, description in PRIORITY_DESCRIPTIONS.items():
-        keyboard_rows.append([types.InlineKeyboardButton(
+    keyboard_rows = [
+        [types.InlineKeyboardButton(
             text=description, 
             callback_data=f"tracker_set_priority_{task_id}_{priority}"
-        )])
-    
+        )]
+        for priority, description in _PRIORITY_ITEMS
+    ]
     keyboard_rows.append([
         types.InlineKeyboardButton(text="⬅️ Назад", callback_data=f"tracker_task_detail_{task_id}")
     ])
@@ -1041,6 +1674,10 @@ async def show_priority_selection(message: types.Message, user_data: TrackerUser
     keyboard = types.InlineKeyboardMarkup(inline_keyboard=keyboard_rows)
     await message.edit_text(text, reply_markup=keyboard, parse_mode="Markdown")
 
+_TASKS_BACK_ROW = [types.InlineKeyboardButton(text="⬅️ К задачам", callback_data="tracker_show_tasks")]
+
+_TASKS_BACK_KEYBOARD = types.InlineKeyboardMarkup(inline_keyboard=[_TASKS_BACK_ROW])
+
 async def show_filtered_tasks(message: types.Message, user_data: TrackerUserData, filter_type: str):
     """Показывает отфильтрованные задачи"""
     if filter_type == "in_progress":
@@ -1055,29 +1692,25 @@ async def show_filtered_tasks(message: types.Message, user_data: TrackerUserData
     
     if not filtered_tasks:
         text = f"{title}\n\nЗадач в этой категории пока нет."
-        keyboard = types.InlineKeyboardMarkup(inline_keyboard=[
-            [types.InlineKeyboardButton(text="⬅️ К задачам", callback_data="tracker_show_tasks")]
-        ])
+        keyboard = _TASKS_BACK_KEYBOARD
     else:
         text = f"{title} ({len(filtered_tasks)})\n\n"
         
-        for i, task in enumerate(filtered_tasks[:10]):
+        shown_tasks = filtered_tasks[:10]
+        for i, task in enumerate(shown_tasks):
             text += f"{i+1}. {format_task_text(task, user_data=user_data)}\n"
         
         if len(filtered_tasks) > 10:
             text += f"\n... и еще {len(filtered_tasks) - 10} задач"
         
-        keyboard_rows = []
-        for i, task in enumerate(filtered_tasks[:5]):
-            button_text = f"{i+1}. {task.title[:20]}{'...' if len(task.title) > 20 else ''}"
-            keyboard_rows.append([types.InlineKeyboardButton(
-                text=button_text, 
+        keyboard_rows = [
+            [types.InlineKeyboardButton(
+                text=f"{i}. {task.title[:20]}{'...' if len(task.title) > 20 else ''}", 
                 callback_data=f"tracker_task_detail_{task.id}"
-            )])
-        
-        keyboard_rows.append([
-            types.InlineKeyboardButton(text="⬅️ К задачам", callback_data="tracker_show_tasks")
-        ])
+            )]
+            for i, task in enumerate(shown_tasks[:5], 1)
+        ]
+        keyboard_rows.append(_TASKS_BACK_ROW)
         
         keyboard = types.InlineKeyboardMarkup(inline_keyboard=keyboard_rows)
     
@@ -1085,109 +1718,114 @@ async def show_filtered_tasks(message: types.Message, user_data: TrackerUserData
 
 # === Функции настроек ===
 
+_SETTINGS_TEMPLATE = (
+    "⚙️ **Настройки трекера**\n\n"
+    "🕘 **Часовой пояс:** {timezone}\n"
+    "⏰ **Текущее время:** {time}\n"
+    "📬 **Время уведомлений:** {notification_time}\n\n"
+    "📊 **Статус уведомлений:**\n"
+    "• Система: {system}\n"
+    "• Дайджест: {digest}\n"
+    "• Дедлайны: {deadlines}\n"
+    "• Новые задачи: {new_tasks}"
+)
+_CHECK_MARK = ("❌", "✅")
+_SYSTEM_STATUS = ("❌ Отключена", "✅ Включена")
+
+# Клавиатура меню настроек не зависит от пользователя
+_SETTINGS_KEYBOARD = types.InlineKeyboardMarkup(inline_keyboard=[
+    [types.InlineKeyboardButton(text="🔔 Уведомления", callback_data="tracker_settings_notifications")],
+    [types.InlineKeyboardButton(text="🌍 Часовой пояс", callback_data="tracker_settings_timezone")],
+    [types.InlineKeyboardButton(text="📬 Тестовый дайджест", callback_data="tracker_test_digest")],
+    [types.InlineKeyboardButton(text="⬅️ Главное меню", callback_data="tracker_main_menu")]
+])
+
+@coalesce_renders
 async def show_settings_menu(message: types.Message, user_data: TrackerUserData):
     """Показывает меню настроек"""
     current_time = get_user_local_time(user_data).strftime('%H:%M')
-    timezone_name = get_common_timezones().get(user_data.timezone, f"🌍 {user_data.timezone}")
-    
-    text = (
-        f"⚙️ **Настройки трекера**\n\n"
-        f"🕘 **Часовой пояс:** {timezone_name}\n"
-        f"⏰ **Текущее время:** {current_time}\n"
-        f"📬 **Время уведомлений:** {user_data.notification_time}\n\n"
-        f"📊 **Статус уведомлений:**\n"
-        f"• Система: {'✅' if user_data.notifications.get('enabled', True) else '❌'} {'Включена' if user_data.notifications.get('enabled', True) else 'Отключена'}\n"
-        f"• Дайджест: {'✅' if user_data.notifications.get('daily_digest', False) else '❌'}\n"
-        f"• Дедлайны: {'✅' if user_data.notifications.get('deadline_reminders', False) else '❌'}\n"
-        f"• Новые задачи: {'✅' if user_data.notifications.get('new_task_notifications', False) else '❌'}"
+    timezone_name = COMMON_TIMEZONES.get(user_data.timezone) or f"🌍 {user_data.timezone}"
+    
+    notifications = user_data.notifications
+    text = _SETTINGS_TEMPLATE.format(
+        timezone=timezone_name,
+        time=current_time,
+        notification_time=user_data.notification_time,
+        system=_SYSTEM_STATUS[bool(notifications.get('enabled', True))],
+        digest=_CHECK_MARK[bool(notifications.get('daily_digest', False))],
+        deadlines=_CHECK_MARK[bool(notifications.get('deadline_reminders', False))],
+        new_tasks=_CHECK_MARK[bool(notifications.get('new_task_notifications', False))],
     )
     
-    keyboard = types.InlineKeyboardMarkup(inline_keyboard=[
-        [types.InlineKeyboardButton(text="🔔 Уведомления", callback_data="tracker_settings_notifications")],
-        [types.InlineKeyboardButton(text="🌍 Часовой пояс", callback_data="tracker_settings_timezone")],
-        [types.InlineKeyboardButton(text="📬 Тестовый дайджест", callback_data="tracker_test_digest")],
-        [types.InlineKeyboardButton(text="⬅️ Главное меню", callback_data="tracker_main_menu")]
-    ])
-    
-    await message.edit_text(text, reply_markup=keyboard, parse_mode="Markdown")
+    await message.edit_text(text, reply_markup=_SETTINGS_KEYBOARD, parse_mode="Markdown")
 
-async def show_notification_settings(message: types.Message, user_data: TrackerUserData):
-    """Показывает настройки уведомлений"""
-    text = (
-        f"🔔 **Настройки уведомлений**\n\n"
-        f"Выберите типы уведомлений, которые хотите получать:"
-    )
-    
-    keyboard_rows = []
-    
-    # Главный переключатель
-    enabled_emoji = "✅" if user_data.notifications.get('enabled', True) else "❌"
-    keyboard_rows.append([types.InlineKeyboardButton(
-        text=f"{enabled_emoji} Включить уведомления", 
-        callback_data="tracker_notif_toggle_enabled"
-    )])
-    
-    # Типы уведомлений
-    for notif_id, notif_desc in NOTIFICATION_TYPES.items():
-        emoji = "✅" if user_data.notifications.get(notif_id, False) else "☐"
-        button_text = f"{emoji} {notif_desc}"
-        keyboard_rows.append([types.InlineKeyboardButton(
-            text=button_text, 
-            callback_data=f"tracker_notif_toggle_{notif_id}"
-        )])
+_SETTINGS_BACK_ROW = [types.InlineKeyboardButton(text="⬅️ Настройки", callback_data="tracker_settings")]
+
+_NOTIFICATION_SETTINGS_TEXT = (
+    "🔔 **Настройки уведомлений**\n\n"
+    "Выберите типы уведомлений, которые хотите получать:"
+)
+
+async def show_notification_settings(message: types.Message, user_data: TrackerUserData, keyboard_only: bool = False):
+    """Показывает настройки уведомлений
     
-    keyboard_rows.append([
-        types.InlineKeyboardButton(text="⬅️ Настройки", callback_data="tracker_settings")
-    ])
+    С keyboard_only=True обновляется только клавиатура (переключение уведомления).
+    """
+    notifications = user_data.notifications
+    keyboard_rows = [
+        # Главный переключатель
+        _NOTIF_ENABLED_ROWS[bool(notifications.get('enabled', True))],
+        # Типы уведомлений
+        *(rows[bool(notifications.get(notif_id, False))] for notif_id, rows in _NOTIF_ROW_VARIANTS),
+        _SETTINGS_BACK_ROW,
+    ]
     
     keyboard = types.InlineKeyboardMarkup(inline_keyboard=keyboard_rows)
-    await message.edit_text(text, reply_markup=keyboard, parse_mode="Markdown")
+    if keyboard_only:
+        if not is_unchanged_render(message, None, keyboard):
+            await message.edit_reply_markup(reply_markup=keyboard)
+        return
+    
+    if not is_unchanged_render(message, _NOTIFICATION_SETTINGS_TEXT, keyboard):
+        await message.edit_text(_NOTIFICATION_SETTINGS_TEXT, reply_markup=keyboard, parse_mode="Markdown")
+
+_TIMEZONE_TEMPLATE = (
+    "🌍 **Выбор часового пояса**\n\n"
+    "Текущий: {timezone}\n"
+    "Время: {time}\n\n"
+    "Выберите ваш часовой пояс:"
+)
+
+# Для каждого пояса две готовые строки клавиатуры: обычная и отмеченная
+_TZ_ROW_VARIANTS = tuple(
+    (tz_id, tuple(
+        [types.InlineKeyboardButton(text=f"{mark}{tz_desc}", callback_data=f"tracker_set_timezone_{tz_id}")]
+        for mark in ("", "✅ ")
+    ))
+    for tz_id, tz_desc in _COMMON_TZ_ITEMS
+)
 
 async def show_timezone_settings(message: types.Message, user_data: TrackerUserData):
     """Показывает настройки часового пояса"""
     current_tz = user_data.timezone
     current_time = get_user_local_time(user_data).strftime('%H:%M')
     
-    text = (
-        f"🌍 **Выбор часового пояса**\n\n"
-        f"Текущий: {get_common_timezones().get(current_tz, current_tz)}\n"
-        f"Время: {current_time}\n\n"
-        f"Выберите ваш часовой пояс:"
-    )
-    
-    keyboard_rows = []
-    timezones = get_common_timezones()
+    text = _TIMEZONE_TEMPLATE.format(timezone=COMMON_TIMEZONES.get(current_tz, current_tz), time=current_time)
     
-    for tz_id, tz_desc in timezones.items():
-        emoji = "✅ " if tz_id == current_tz else ""
-        keyboard_rows.append([types.InlineKeyboardButton(
-            text=f"{emoji}{tz_desc}", 
-            callback_data=f"tracker_set_timezone_{tz_id}"
-        )])
-    
-    keyboard_rows.append([
-        types.InlineKeyboardButton(text="⬅️ Настройки", callback_data="tracker_settings")
-    ])
+    # Строки кнопок заготовлены заранее, меняется только выбор отмеченной
+    keyboard_rows = [rows[tz_id == current_tz] for tz_id, rows in _TZ_ROW_VARIANTS]
+    keyboard_rows.append(_SETTINGS_BACK_ROW)
     
     keyboard = types.InlineKeyboardMarkup(inline_keyboard=keyboard_rows)
-    await message.edit_text(text, reply_markup=keyboard, parse_mode="Markdown")
+    # Повторный выбор текущего пояса в ту же минуту ничего не меняет
+    if not is_unchanged_render(message, text, keyboard):
+        await message.edit_text(text, reply_markup=keyboard, parse_mode="Markdown")
 
 async def handle_welcome_module(message: types.Message, user_data: TrackerUserData):
     """Обработка приветственного модуля"""
-    if user_data.step == WelcomeState.STEP_1_GREETING:
-        await show_step_1_greeting(message, user_data)
-    elif user_data.step == WelcomeState.STEP_2_ANXIETY_INTRO:
-        await show_step_2_anxiety_intro(message, user_data)
-    elif user_data.step == WelcomeState.STEP_2_ANXIETY_SURVEY:
-        await handle_anxiety_survey(message, user_data)
-    elif user_data.step == WelcomeState.STEP_3_GOALS:
-        await handle_goals_selection(message, user_data)
-    elif user_data.step == WelcomeState.STEP_4_NOTIFICATIONS:
-        await handle_notifications_setup(message, user_data)
-    elif user_data.step == WelcomeState.STEP_5_AI_MENTOR:
-        await handle_ai_mentor_intro(message, user_data)
-    elif user_data.step == WelcomeState.STEP_6_COMPLETION:
-        await handle_completion(message, user_data)
+    handler = WELCOME_HANDLERS.get(user_data.step)
+    if handler is not None:
+        await handler(message, user_data)
 
 async def handle_main_tracker_functionality(message: types.Message, user_data: TrackerUserData):
     """Обработка основного функционала трекера (после завершения приветственного модуля)"""
@@ -1200,17 +1838,9 @@ async def handle_main_tracker_functionality(message: types.Message, user_data: T
             return
     
     # Обработка команд для управления задачами
-    if user_message.lower().startswith(('/задачи', '/tasks', 'задачи', 'tasks')):
-        await show_tasks_menu(message, user_data)
-        return
-    elif user_message.lower().startswith(('/новая', '/new', 'новая задача', 'создать задачу')):
-        await start_task_creation(message, user_data)
-        return
-    elif user_message.lower().startswith(('/меню', '/menu', 'меню')):
-        await show_main_menu(message, user_data)
-        return
-    elif user_message.lower().startswith(('/вечерний', '/evening', 'вечерний трекер')):
-        await show_evening_tracker_start(message, user_data)
+    command = _COMMAND_RE.match(user_message.lower())
+    if command is not None:
+        await COMMAND_HANDLERS[command.group(1)](message, user_data)
         return
     
     # Если пользователь в процессе создания задачи
@@ -1220,6 +1850,7 @@ async def handle_main_tracker_functionality(message: types.Message, user_data: T
     
     # Если пользователь общался с AI-ментором, продолжаем общение
     if user_data.met_ai_mentor and user_message and not user_message.startswith('/'):
+        show_typing(message)
         ai_response = await chat_with_ai_mentor(user_data, user_message)
         await message.answer(f"🤖 **AI-ментор:**\n\n{ai_response}", parse_mode="Markdown")
         return
@@ -1229,25 +1860,30 @@ async def handle_main_tracker_functionality(message: types.Message, user_data: T
 
 # === UI функции для работы с задачами ===
 
+_MAIN_MENU_TEMPLATE = (
+    "🎯 **Главное меню трекера**\n\n"
+    "📊 **Статистика задач:**\n"
+    "• Всего задач: {total}\n"
+    "• ⏳ Ожидают: {pending}\n"
+    "• 🔄 В работе: {in_progress}\n"
+    "• ✅ Выполнены: {completed}\n\n"
+    "Выберите действие:"
+)
+
 async def show_main_menu(message: types.Message, user_data: TrackerUserData):
     """Показывает главное меню трекера"""
     user_data.current_view = "main"
-    save_user_data(user_data)
+    save_user_data_later(user_data, fields=("current_view",))
     
     # Подсчет задач по статусам
-    pending_count = len(get_tasks_by_status(user_data, TaskStatus.PENDING))
-    in_progress_count = len(get_tasks_by_status(user_data, TaskStatus.IN_PROGRESS))
-    completed_count = len(get_tasks_by_status(user_data, TaskStatus.COMPLETED))
+    pending_count = get_task_count(user_data, TaskStatus.PENDING)
+    in_progress_count = get_task_count(user_data, TaskStatus.IN_PROGRESS)
+    completed_count = get_task_count(user_data, TaskStatus.COMPLETED)
     total_tasks = len(user_data.tasks)
     
-    text = (
-        f"🎯 **Главное меню трекера**\n\n"
-        f"📊 **Статистика задач:**\n"
-        f"• Всего задач: {total_tasks}\n"
-        f"• ⏳ Ожидают: {pending_count}\n"
-        f"• 🔄 В работе: {in_progress_count}\n"
-        f"• ✅ Выполнены: {completed_count}\n\n"
-        f"Выберите действие:"
+    text = _MAIN_MENU_TEMPLATE.format(
+        total=total_tasks, pending=pending_count,
+        in_progress=in_progress_count, completed=completed_count
     )
     
     keyboard_rows = [
@@ -1266,20 +1902,23 @@ async def show_main_menu(message: types.Message, user_data: TrackerUserData):
     
     await message.answer(text, reply_markup=keyboard, parse_mode="Markdown")
 
+_NO_TASKS_KEYBOARD = types.InlineKeyboardMarkup(inline_keyboard=[
+    [types.InlineKeyboardButton(text="➕ Создать задачу", callback_data="tracker_new_task")],
+    [types.InlineKeyboardButton(text="⬅️ Главное меню", callback_data="tracker_main_menu")]
+])
+
+@coalesce_renders
 async def show_tasks_menu(message: types.Message, user_data: TrackerUserData):
     """Показывает меню с задачами"""
     user_data.current_view = "tasks"
-    save_user_data(user_data)
+    save_user_data_later(user_data, fields=("current_view",))
     
     if not user_data.tasks:
         text = (
             f"📋 **Мои задачи**\n\n"
             f"У вас пока нет задач. Создайте первую задачу!"
         )
-        keyboard = types.InlineKeyboardMarkup(inline_keyboard=[
-            [types.InlineKeyboardButton(text="➕ Создать задачу", callback_data="tracker_new_task")],
-            [types.InlineKeyboardButton(text="⬅️ Главное меню", callback_data="tracker_main_menu")]
-        ])
+        keyboard = _NO_TASKS_KEYBOARD
     else:
         # Получаем задачи, отсортированные по приоритету и статусу
         sorted_tasks = get_tasks_sorted(user_data, "priority")
@@ -1287,7 +1926,8 @@ async def show_tasks_menu(message: types.Message, user_data: TrackerUserData):
         text = f"📋 **Мои задачи** ({len(user_data.tasks)})\n\n"
         
         # Показываем первые 5 задач
-        for i, task in enumerate(sorted_tasks[:5]):
+        shown_tasks = sorted_tasks[:5]
+        for i, task in enumerate(shown_tasks):
             text += f"{i+1}. {format_task_text(task, user_data=user_data)}\n"
         
         if len(sorted_tasks) > 5:
@@ -1296,7 +1936,7 @@ async def show_tasks_menu(message: types.Message, user_data: TrackerUserData):
         keyboard_rows = []
         
         # Кнопки для первых задач
-        for i, task in enumerate(sorted_tasks[:3]):
+        for i, task in enumerate(shown_tasks[:3]):
             button_text = f"{i+1}. {task.title[:20]}{'...' if len(task.title) > 20 else ''}"
             keyboard_rows.append([types.InlineKeyboardButton(
                 text=button_text, 
@@ -1320,21 +1960,21 @@ async def show_tasks_menu(message: types.Message, user_data: TrackerUserData):
     
     await message.answer(text, reply_markup=keyboard, parse_mode="Markdown")
 
+_TASK_CREATION_KEYBOARD = types.InlineKeyboardMarkup(inline_keyboard=[
+    [types.InlineKeyboardButton(text="❌ Отмена", callback_data="tracker_cancel_creation")]
+])
+
 async def start_task_creation(message: types.Message, user_data: TrackerUserData):
     """Начинает процесс создания новой задачи"""
     user_data.current_view = "creating_task"
-    save_user_data(user_data)
+    save_user_data_later(user_data, fields=("current_view",))
     
     text = (
         f"➕ **Создание новой задачи**\n\n"
         f"Напишите название задачи:"
     )
     
-    keyboard = types.InlineKeyboardMarkup(inline_keyboard=[
-        [types.InlineKeyboardButton(text="❌ Отмена", callback_data="tracker_cancel_creation")]
-    ])
-    
-    await message.answer(text, reply_markup=keyboard, parse_mode="Markdown")
+    await message.answer(text, reply_markup=_TASK_CREATION_KEYBOARD, parse_mode="Markdown")
 
 async def handle_task_creation_input(message: types.Message, user_data: TrackerUserData):
     """Обрабатывает ввод при создании задачи"""
@@ -1350,7 +1990,7 @@ async def handle_task_creation_input(message: types.Message, user_data: TrackerU
     # Создаем задачу
     task = create_task(user_data, task_title)
     user_data.current_view = "main"
-    save_user_data(user_data)
+    save_user_data_later(user_data, fields=("current_view",))
     
     text = (
         f"✅ **Задача создана!**\n\n"
@@ -1371,17 +2011,24 @@ async def handle_task_creation_input(message: types.Message, user_data: TrackerU
     
     await message.answer(text, reply_markup=keyboard, parse_mode="Markdown")
 
-async def show_task_detail(message: types.Message, user_data: TrackerUserData, task_id: str):
-    """Показывает детали задачи"""
+_TASK_DETAIL_HEADER = "📋 **Детали задачи**\n\n"
+
+@coalesce_renders
+async def show_task_detail(message: types.Message, user_data: TrackerUserData, task_id: str,
+                           banner: Optional[str] = None):
+    """Показывает детали задачи
+    
+    banner выводится над деталями - так подтверждение действия приходит
+    тем же редактированием сообщения, без отдельного запроса.
+    """
     task = get_task_by_id(user_data, task_id)
     if not task:
         await message.answer("❌ Задача не найдена", parse_mode="Markdown")
         return
     
-    text = (
-        f"📋 **Детали задачи**\n\n"
-        f"{format_task_text(task, show_details=True, user_data=user_data)}"
-    )
+    text = _TASK_DETAIL_HEADER + format_task_text(task, show_details=True, user_data=user_data)
+    if banner:
+        text = f"{banner}\n\n{text}"
     
     keyboard_rows = []
     
@@ -1416,10 +2063,32 @@ async def show_task_detail(message: types.Message, user_data: TrackerUserData, t
     
     await message.edit_text(text, reply_markup=keyboard, parse_mode="Markdown")
 
+async def _acquire_send_token():
+    """Ждет свободный токен в корзине исходящих сообщений"""
+    global _send_tokens, _send_tokens_ts
+    while True:
+        now = time.monotonic()
+        _send_tokens = min(SEND_RATE_LIMIT, _send_tokens + (now - _send_tokens_ts) * SEND_RATE_LIMIT)
+        _send_tokens_ts = now
+        if _send_tokens >= 1:
+            _send_tokens -= 1
+            return
+        await asyncio.sleep((1 - _send_tokens) / SEND_RATE_LIMIT)
+
+async def throttled_send(send, *args, **kwargs):
+    """Вызывает метод отправки (message.answer, message.edit_text) с учетом лимитов Telegram"""
+    async with _send_sem:
+        await _acquire_send_token()
+        return await send(*args, **kwargs)
+
 # Заглушки для функций шагов - будут реализованы далее
+_STEP1_KEYBOARD = types.InlineKeyboardMarkup(inline_keyboard=[
+    [types.InlineKeyboardButton(text="▶️ Начать", callback_data="tracker_step_1_next")]
+])
+
 async def show_step_1_greeting(message: types.Message, user_data: TrackerUserData):
     """Шаг 1: Приветствие и объяснение цели"""
-    progress = create_progress_bar(get_step_number(user_data.step))
+    progress = _PROGRESS_BARS[get_step_number(user_data.step)]
     
     text = (
         f"🎯 **Добро пожаловать в Трекер задач!**\n\n"
@@ -1431,17 +2100,18 @@ async def show_step_1_greeting(message: types.Message, user_data: TrackerUserDat
         f"использоваться только для персонализации вашего опыта."
     )
     
-    keyboard = types.InlineKeyboardMarkup(inline_keyboard=[
-        [types.InlineKeyboardButton(text="▶️ Начать", callback_data="tracker_step_1_next")]
-    ])
-    
-    await message.answer(text, reply_markup=keyboard, parse_mode="Markdown")
+    await throttled_send(message.answer, text, reply_markup=_STEP1_KEYBOARD, parse_mode="Markdown")
     
     logger.info(f"Shown step 1 greeting to user {user_data.user_id}")
 
+_STEP2_KEYBOARD = types.InlineKeyboardMarkup(inline_keyboard=[
+    [types.InlineKeyboardButton(text="📝 Начать опросник", callback_data="tracker_anxiety_start")],
+    [types.InlineKeyboardButton(text="⏭️ Пропустить", callback_data="tracker_anxiety_skip")]
+])
+
 async def show_step_2_anxiety_intro(message: types.Message, user_data: TrackerUserData):
     """Шаг 2: Введение в опросник тревожности"""
-    progress = create_progress_bar(get_step_number(user_data.step))
+    progress = _PROGRESS_BARS[get_step_number(user_data.step)]
     
     text = (
         f"📋 **Шаг 2: Понимание вашего состояния**\n\n"
@@ -1457,15 +2127,22 @@ async def show_step_2_anxiety_intro(message: types.Message, user_data: TrackerUs
         f"• 5 - Полностью согласен"
     )
     
-    keyboard = types.InlineKeyboardMarkup(inline_keyboard=[
-        [types.InlineKeyboardButton(text="📝 Начать опросник", callback_data="tracker_anxiety_start")],
-        [types.InlineKeyboardButton(text="⏭️ Пропустить", callback_data="tracker_anxiety_skip")]
-    ])
-    
-    await message.edit_text(text, reply_markup=keyboard, parse_mode="Markdown")
+    await throttled_send(message.edit_text, text, reply_markup=_STEP2_KEYBOARD, parse_mode="Markdown")
     
     logger.info(f"Shown step 2 anxiety intro to user {user_data.user_id}")
 
+# Клавиатуры ответов для каждого вопроса опросника
+_ANXIETY_QUESTION_KEYBOARDS = tuple(
+    types.InlineKeyboardMarkup(inline_keyboard=[
+        [
+            types.InlineKeyboardButton(text=str(score), callback_data=f"tracker_anxiety_answer_{question_num}_{score}")
+            for score in range(1, 6)
+        ],
+        [types.InlineKeyboardButton(text="⏮️ Назад", callback_data=f"tracker_anxiety_back_{question_num}")]
+    ])
+    for question_num in range(len(ANXIETY_QUESTIONS))
+)
+
 async def show_anxiety_question(message: types.Message, user_data: TrackerUserData, question_num: int):
     """Показывает вопрос опросника тревожности"""
     if question_num >= len(ANXIETY_QUESTIONS):
@@ -1473,7 +2150,7 @@ async def show_anxiety_question(message: types.Message, user_data: TrackerUserDa
         await finish_anxiety_survey(message, user_data)
         return
     
-    progress = create_progress_bar(get_step_number(user_data.step))
+    progress = _PROGRESS_BARS[get_step_number(user_data.step)]
     current_question = ANXIETY_QUESTIONS[question_num]
     
     text = (
@@ -1484,18 +2161,11 @@ async def show_anxiety_question(message: types.Message, user_data: TrackerUserDa
         f"Насколько вы согласны с этим утверждением?"
     )
     
-    keyboard = types.InlineKeyboardMarkup(inline_keyboard=[
-        [
-            types.InlineKeyboardButton(text="1", callback_data=f"tracker_anxiety_answer_{question_num}_1"),
-            types.InlineKeyboardButton(text="2", callback_data=f"tracker_anxiety_answer_{question_num}_2"),
-            types.InlineKeyboardButton(text="3", callback_data=f"tracker_anxiety_answer_{question_num}_3"),
-            types.InlineKeyboardButton(text="4", callback_data=f"tracker_anxiety_answer_{question_num}_4"),
-            types.InlineKeyboardButton(text="5", callback_data=f"tracker_anxiety_answer_{question_num}_5")
-        ],
-        [types.InlineKeyboardButton(text="⏮️ Назад", callback_data=f"tracker_anxiety_back_{question_num}")]
-    ])
-    
-    await message.edit_text(text, reply_markup=keyboard, parse_mode="Markdown")
+    await throttled_send(message.edit_text, text, reply_markup=_ANXIETY_QUESTION_KEYBOARDS[question_num], parse_mode="Markdown")
+
+_ANXIETY_RESULT_KEYBOARD = types.InlineKeyboardMarkup(inline_keyboard=[
+    [types.InlineKeyboardButton(text="▶️ Продолжить", callback_data="tracker_step_3_goals")]
+])
 
 async def finish_anxiety_survey(message: types.Message, user_data: TrackerUserData):
     """Завершает опросник и показывает результаты"""
@@ -1504,20 +2174,12 @@ async def finish_anxiety_survey(message: types.Message, user_data: TrackerUserDa
         user_data.anxiety_level = round(avg_score, 1)
         
         # Интерпретация результатов
-        if avg_score <= 2.0:
-            level_text = "Низкий уровень тревожности 😌"
-            advice = "У вас хорошие навыки управления стрессом!"
-        elif avg_score <= 3.5:
-            level_text = "Умеренный уровень тревожности 😐"
-            advice = "Иногда стресс может влиять на вашу работу."
-        else:
-            level_text = "Повышенный уровень тревожности 😰"
-            advice = "Трекер поможет вам лучше управлять стрессом."
+        level_text, advice, _ = interpret_anxiety(avg_score)
     else:
         level_text = "Не указан"
         advice = "Вы можете пройти опросник позже в настройках."
     
-    progress = create_progress_bar(get_step_number(user_data.step))
+    progress = _PROGRESS_BARS[get_step_number(user_data.step)]
     
     text = (
         f"📊 **Результаты опросника**\n\n"
@@ -1527,23 +2189,35 @@ async def finish_anxiety_survey(message: types.Message, user_data: TrackerUserDa
         f"Готовы перейти к выбору ваших целей?"
     )
     
-    keyboard = types.InlineKeyboardMarkup(inline_keyboard=[
-        [types.InlineKeyboardButton(text="▶️ Продолжить", callback_data="tracker_step_3_goals")]
-    ])
-    
     user_data.step = WelcomeState.STEP_3_GOALS
-    save_user_data(user_data)
+    save_user_data_later(user_data, fields=("step", "anxiety_level"))
     
-    await message.edit_text(text, reply_markup=keyboard, parse_mode="Markdown")
+    await throttled_send(message.edit_text, text, reply_markup=_ANXIETY_RESULT_KEYBOARD, parse_mode="Markdown")
 
 async def handle_anxiety_survey(message: types.Message, user_data: TrackerUserData):
     """Обработка опросника тревожности"""
     # Показываем первый вопрос
     await show_anxiety_question(message, user_data, 0)
 
-async def show_step_3_goals(message: types.Message, user_data: TrackerUserData):
-    """Показывает Шаг 3: Выбор целей использования"""
-    progress = create_progress_bar(get_step_number(user_data.step))
+async def show_step_3_goals(message: types.Message, user_data: TrackerUserData, keyboard_only: bool = False):
+    """Показывает Шаг 3: Выбор целей использования
+    
+    С keyboard_only=True обновляется только клавиатура (переключение цели).
+    """
+    # Строки целей заготовлены заранее, выбирается только отмеченный вариант
+    goals = user_data.goals
+    keyboard_rows = [rows[goal_id in goals] for goal_id, rows in _GOAL_ROW_VARIANTS]
+    
+    # Добавляем кнопки навигации
+    keyboard_rows.append(_STEP3_NAV_ROW)
+    
+    keyboard = types.InlineKeyboardMarkup(inline_keyboard=keyboard_rows)
+    if keyboard_only:
+        if not is_unchanged_render(message, None, keyboard):
+            await throttled_send(message.edit_reply_markup, reply_markup=keyboard)
+        return
+    
+    progress = _PROGRESS_BARS[get_step_number(user_data.step)]
     
     text = (
         f"🎯 **Шаг 3: Ваши цели**\n\n"
@@ -1553,33 +2227,35 @@ async def show_step_3_goals(message: types.Message, user_data: TrackerUserData):
         f"Вы можете выбрать несколько вариантов:"
     )
     
-    # Создаем кнопки для каждой цели
-    keyboard_rows = []
-    for goal_id, goal_desc in GOAL_DESCRIPTIONS.items():
-        emoji = "✅" if goal_id in user_data.goals else "☐"
-        button_text = f"{emoji} {goal_desc}"
-        keyboard_rows.append([types.InlineKeyboardButton(
-            text=button_text, 
-            callback_data=f"tracker_goal_toggle_{goal_id}"
-        )])
-    
-    # Добавляем кнопки навигации
-    keyboard_rows.append([
-        types.InlineKeyboardButton(text="⏮️ Назад", callback_data="tracker_step_2_back"),
-        types.InlineKeyboardButton(text="▶️ Продолжить", callback_data="tracker_step_4_notifications")
-    ])
-    
-    keyboard = types.InlineKeyboardMarkup(inline_keyboard=keyboard_rows)
-    
-    await message.edit_text(text, reply_markup=keyboard, parse_mode="Markdown")
+    if not is_unchanged_render(message, text, keyboard):
+        await throttled_send(message.edit_text, text, reply_markup=keyboard, parse_mode="Markdown")
 
 async def handle_goals_selection(message: types.Message, user_data: TrackerUserData):
     """Шаг 3: Выбор целей использования"""
     await show_step_3_goals(message, user_data)
 
-async def show_step_4_notifications(message: types.Message, user_data: TrackerUserData):
-    """Показывает Шаг 4: Настройка уведомлений"""
-    progress = create_progress_bar(get_step_number(user_data.step))
+async def show_step_4_notifications(message: types.Message, user_data: TrackerUserData, keyboard_only: bool = False):
+    """Показывает Шаг 4: Настройка уведомлений
+    
+    С keyboard_only=True обновляется только клавиатура (переключение уведомления).
+    """
+    # Строки уведомлений заготовлены заранее, выбирается только отмеченный вариант
+    notifications = user_data.notifications
+    keyboard_rows = [rows[bool(notifications.get(notif_id, False))] for notif_id, rows in _NOTIF_ROW_VARIANTS]
+    
+    # Кнопка для полного отключения уведомлений
+    keyboard_rows.append(_STEP4_ENABLED_ROWS[bool(notifications.get("enabled", True))])
+    
+    # Добавляем кнопки навигации
+    keyboard_rows.append(_STEP4_NAV_ROW)
+    
+    keyboard = types.InlineKeyboardMarkup(inline_keyboard=keyboard_rows)
+    if keyboard_only:
+        if not is_unchanged_render(message, None, keyboard):
+            await throttled_send(message.edit_reply_markup, reply_markup=keyboard)
+        return
+    
+    progress = _PROGRESS_BARS[get_step_number(user_data.step)]
     
     text = (
         f"🔔 **Шаг 4: Уведомления**\n\n"
@@ -1589,40 +2265,24 @@ async def show_step_4_notifications(message: types.Message, user_data: TrackerUs
         f"Вы можете изменить эти настройки в любое время:"
     )
     
-    # Создаем кнопки для каждого типа уведомлений
-    keyboard_rows = []
-    for notif_id, notif_desc in NOTIFICATION_TYPES.items():
-        emoji = "✅" if user_data.notifications.get(notif_id, False) else "☐"
-        button_text = f"{emoji} {notif_desc}"
-        keyboard_rows.append([types.InlineKeyboardButton(
-            text=button_text, 
-            callback_data=f"tracker_notif_toggle_{notif_id}"
-        )])
-    
-    # Кнопка для полного отключения уведомлений
-    enabled_emoji = "✅" if user_data.notifications.get("enabled", True) else "☐"
-    keyboard_rows.append([types.InlineKeyboardButton(
-        text=f"{enabled_emoji} Включить уведомления", 
-        callback_data="tracker_notif_toggle_enabled"
-    )])
-    
-    # Добавляем кнопки навигации
-    keyboard_rows.append([
-        types.InlineKeyboardButton(text="⏮️ Назад", callback_data="tracker_step_3_back"),
-        types.InlineKeyboardButton(text="▶️ Продолжить", callback_data="tracker_step_5_ai_mentor")
-    ])
-    
-    keyboard = types.InlineKeyboardMarkup(inline_keyboard=keyboard_rows)
-    
-    await message.edit_text(text, reply_markup=keyboard, parse_mode="Markdown")
+    if not is_unchanged_render(message, text, keyboard):
+        await throttled_send(message.edit_text, text, reply_markup=keyboard, parse_mode="Markdown")
 
 async def handle_notifications_setup(message: types.Message, user_data: TrackerUserData):
     """Шаг 4: Настройка уведомлений"""
     await show_step_4_notifications(message, user_data)
 
+_STEP5_KEYBOARD = types.InlineKeyboardMarkup(inline_keyboard=[
+    [types.InlineKeyboardButton(text="👋 Познакомиться", callback_data="tracker_meet_ai_mentor")],
+    [
+        types.InlineKeyboardButton(text="⏮️ Назад", callback_data="tracker_step_4_back"),
+        types.InlineKeyboardButton(text="⏭️ Пропустить", callback_data="tracker_step_6_completion")
+    ]
+])
+
 async def show_step_5_ai_mentor(message: types.Message, user_data: TrackerUserData):
     """Показывает Шаг 5: Знакомство с AI-ментором"""
-    progress = create_progress_bar(get_step_number(user_data.step))
+    progress = _PROGRESS_BARS[get_step_number(user_data.step)]
     
     text = (
         f"🤖 **Шаг 5: Знакомство с AI-ментором**\n\n"
@@ -1638,24 +2298,23 @@ async def show_step_5_ai_mentor(message: types.Message, user_data: TrackerUserDa
         f"Хотите познакомиться с ним?"
     )
     
-    keyboard = types.InlineKeyboardMarkup(inline_keyboard=[
-        [types.InlineKeyboardButton(text="👋 Познакомиться", callback_data="tracker_meet_ai_mentor")],
-        [
-            types.InlineKeyboardButton(text="⏮️ Назад", callback_data="tracker_step_4_back"),
-            types.InlineKeyboardButton(text="⏭️ Пропустить", callback_data="tracker_step_6_completion")
-        ]
-    ])
-    
-    await message.edit_text(text, reply_markup=keyboard, parse_mode="Markdown")
+    await throttled_send(message.edit_text, text, reply_markup=_STEP5_KEYBOARD, parse_mode="Markdown")
+
+_AI_MENTOR_INTRO_KEYBOARD = types.InlineKeyboardMarkup(inline_keyboard=[
+    [types.InlineKeyboardButton(text="💬 Продолжить общение", callback_data="tracker_ai_mentor_continue")],
+    [types.InlineKeyboardButton(text="▶️ Завершить настройку", callback_data="tracker_step_6_completion")]
+])
 
 async def initiate_ai_mentor_chat(message: types.Message, user_data: TrackerUserData):
     """Инициирует первое общение с AI-ментором"""
     # Отправляем приветственное сообщение ментору
     welcome_message = "Привет! Это наша первая встреча в рамках настройки трекера задач."
     
-    await message.edit_text("🤖 Соединяюсь с AI-ментором...", parse_mode="Markdown")
-    
-    ai_response = await chat_with_ai_mentor(user_data, welcome_message)
+    # Заглушка отправляется параллельно с запросом к ментору, а не перед ним
+    _, ai_response = await asyncio.gather(
+        throttled_send(message.edit_text, "🤖 Соединяюсь с AI-ментором...", parse_mode="Markdown"),
+        chat_with_ai_mentor(user_data, welcome_message),
+    )
     
     text = (
         f"🤖 **AI-ментор подключился!**\n\n"
@@ -1663,63 +2322,64 @@ async def initiate_ai_mentor_chat(message: types.Message, user_data: TrackerUser
         f"💬 Вы можете задать ему любой вопрос или продолжить настройку трекера."
     )
     
-    keyboard = types.InlineKeyboardMarkup(inline_keyboard=[
-        [types.InlineKeyboardButton(text="💬 Продолжить общение", callback_data="tracker_ai_mentor_continue")],
-        [types.InlineKeyboardButton(text="▶️ Завершить настройку", callback_data="tracker_step_6_completion")]
-    ])
-    
-    await message.edit_text(text, reply_markup=keyboard, parse_mode="Markdown")
+    await throttled_send(message.edit_text, text, reply_markup=_AI_MENTOR_INTRO_KEYBOARD, parse_mode="Markdown")
 
 async def handle_ai_mentor_intro(message: types.Message, user_data: TrackerUserData):
     """Шаг 5: Знакомство с AI-ментором"""
     await show_step_5_ai_mentor(message, user_data)
 
+_FINAL_PROGRESS_BAR = _PROGRESS_BARS[6]
+
+# Текст Шага 6 в HTML: статичные строки собраны заранее, при отрисовке
+# подставляются только экранированные значения настроек
+_STEP6_HEAD = (
+    "🎉 <b>Поздравляем! Настройка завершена</b>",
+    "",
+    "Спасибо, что прошли приветственный модуль! "
+    "Я готов помочь вам в управлении задачами и снижении стресса.",
+    "",
+    f"📊 Прогресс: {html.escape(_FINAL_PROGRESS_BAR, quote=False)}",
+    "",
+    "📋 <b>Ваши настройки:</b>",
+)
+
+_STEP6_TAIL = (
+    "",
+    "🚀 Теперь вы можете начать использовать трекер задач! "
+    "Все настройки можно изменить в любое время.",
+)
+
+_STEP6_KEYBOARD = types.InlineKeyboardMarkup(inline_keyboard=[
+    [types.InlineKeyboardButton(text="🎯 Начать работу с трекером", callback_data="tracker_start_main")]
+])
+
 async def show_step_6_completion(message: types.Message, user_data: TrackerUserData):
     """Показывает Шаг 6: Завершение приветственного модуля"""
-    progress = create_progress_bar(6)  # Финальный шаг
-    
     # Подготавливаем сводку настроек
-    anxiety_text = "не указан"
     if user_data.anxiety_level:
-        if user_data.anxiety_level <= 2.0:
-            anxiety_text = "низкий 😌"
-        elif user_data.anxiety_level <= 3.5:
-            anxiety_text = "умеренный 😐"
-        else:
-            anxiety_text = "повышенный 😰"
+        anxiety_text = interpret_anxiety(user_data.anxiety_level)[2]
+    else:
+        anxiety_text = "не указан"
     
-    goals_text = "не выбраны"
-    if user_data.goals:
-        goal_names = [GOAL_DESCRIPTIONS[goal] for goal in user_data.goals if goal in GOAL_DESCRIPTIONS]
-        goals_text = ", ".join(goal_names).lower()
+    goals_text = ", ".join(_GOAL_LABELS_LC[goal] for goal in user_data.goals) or "не выбраны"
     
     notifications_text = "включены" if user_data.notifications.get("enabled", True) else "отключены"
     ai_mentor_text = "да" if user_data.met_ai_mentor else "нет"
     
-    text = (
-        f"🎉 **Поздравляем! Настройка завершена**\n\n"
-        f"Спасибо, что прошли приветственный модуль! "
-        f"Я готов помочь вам в управлении задачами и снижении стресса.\n\n"
-        f"📊 Прогресс: {progress}\n\n"
-        f"📋 **Ваши настройки:**\n"
-        f"• Уровень тревожности: {anxiety_text}\n"
-        f"• Цели: {goals_text}\n"
-        f"• Уведомления: {notifications_text}\n"
-        f"• Знакомство с AI-ментором: {ai_mentor_text}\n\n"
-        f"🚀 Теперь вы можете начать использовать трекер задач! "
-        f"Все настройки можно изменить в любое время."
+    body = (
+        f"• Уровень тревожности: {html.escape(anxiety_text, quote=False)}",
+        f"• Цели: {html.escape(goals_text, quote=False)}",
+        f"• Уведомления: {notifications_text}",
+        f"• Знакомство с AI-ментором: {ai_mentor_text}",
     )
-    
-    keyboard = types.InlineKeyboardMarkup(inline_keyboard=[
-        [types.InlineKeyboardButton(text="🎯 Начать работу с трекером", callback_data="tracker_start_main")]
-    ])
+    text = "\n".join(_STEP6_HEAD + body + _STEP6_TAIL)
     
     # Помечаем приветственный модуль как завершенный
     user_data.completed = True
     user_data.step = WelcomeState.COMPLETED
-    save_user_data(user_data)
+    save_user_data_later(user_data, fields=("completed", "step"))
     
-    await message.edit_text(text, reply_markup=keyboard, parse_mode="Markdown")
+    await throttled_send(message.edit_text, text, reply_markup=_STEP6_KEYBOARD, parse_mode="HTML")
 
 async def handle_completion(message: types.Message, user_data: TrackerUserData):
     """Шаг 6: Завершение приветственного модуля"""
@@ -1727,49 +2387,97 @@ async def handle_completion(message: types.Message, user_data: TrackerUserData):
 
 # === Функции вечернего трекера ===
 
+# Сегодняшняя дата по часовым поясам: имя пояса -> (начало дня, момент следующей полуночи, дата)
+TODAY_CACHE_MAX = 1024
+_today_by_timezone: "OrderedDict[str, tuple]" = OrderedDict()
+
 def get_today_date_str(user_data: TrackerUserData) -> str:
-    """Получает сегодняшнюю дату в часовом поясе пользователя"""
-    try:
-        user_tz = pytz.timezone(user_data.timezone)
-        today = datetime.now(user_tz).date()
-        return today.strftime('%Y-%m-%d')
-    except:
-        return datetime.now().date().strftime('%Y-%m-%d')
-
-def can_start_evening_session(user_data: TrackerUserData) -> bool:
-    """Проверяет, можно ли начать вечернюю сессию"""
+    """Получает сегодняшнюю дату в часовом поясе пользователя
+    
+    Дата кешируется для пояса, пока время запроса лежит внутри этих суток,
+    поэтому и часы, сдвинутые назад, не получат устаревшую дату.
+    """
+    cached = _today_by_timezone.get(user_data.timezone)
+    if cached is not None and cached[0] <= request_now() < cached[1]:
+        return cached[2]
+    
+    local_now = get_user_local_time(user_data)
+    midnight = local_now.replace(hour=0, minute=0, second=0, microsecond=0)
+    next_midnight = (local_now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    today = local_now.strftime('%Y-%m-%d')
+    _today_by_timezone[user_data.timezone] = (midnight.timestamp(), next_midnight.timestamp(), today)
+    _today_by_timezone.move_to_end(user_data.timezone)
+    if len(_today_by_timezone) > TODAY_CACHE_MAX:
+        _today_by_timezone.popitem(last=False)
+    return today
+
+def iter_active_tasks(user_data: TrackerUserData):
+    """Итерирует активные задачи без создания списка: сначала ожидающие, затем в работе"""
+    by_status = user_data._by_status
+    return itertools.chain(by_status.get(TaskStatus.PENDING, ()), by_status.get(TaskStatus.IN_PROGRESS, ()))
+
+def get_active_tasks(user_data: TrackerUserData) -> List[TrackerTask]:
+    """Возвращает активные задачи: сначала ожидающие, затем в работе"""
+    return list(iter_active_tasks(user_data))
+
+def can_start_evening_session(user_data: TrackerUserData, active_tasks: Optional[List[TrackerTask]] = None) -> bool:
+    """Проверяет, можно ли начать вечернюю сессию
+    
+    active_tasks можно передать, если вызывающий код уже получил их через get_active_tasks.
+    """
     if not user_data.evening_tracking_enabled:
         return False
     
     # Проверяем, есть ли активные задачи
-    active_tasks = get_tasks_by_status(user_data, TaskStatus.PENDING) + get_tasks_by_status(user_data, TaskStatus.IN_PROGRESS)
-    if not active_tasks:
+    if active_tasks is None:
+        active_tasks = iter_active_tasks(user_data)
+    if next(iter(active_tasks), None) is None:
         return False
     
     # Проверяем, не была ли уже проведена сессия сегодня
-    today = get_today_date_str(user_data)
-    for summary in user_data.daily_summaries:
-        if isinstance(summary, dict) and summary.get('date') == today:
-            return False
-        elif hasattr(summary, 'date') and summary.date == today:
-            return False
-    
-    return True
-
-def start_evening_session(user_data: TrackerUserData) -> EveningTrackingSession:
+    return get_today_date_str(user_data) not in user_data._summary_dates
+
+# Последняя разобранная вечерняя сессия по пользователям: user_id -> (словарь сессии, объект).
+# Объект переиспользуется, пока в user_data лежит тот же словарь, что был из него сохранен
+EVENING_SESSION_CACHE_MAX = 1024
+_evening_session_cache: "OrderedDict[int, tuple]" = OrderedDict()
+
+def store_evening_session(user_data: TrackerUserData, session: EveningTrackingSession):
+    """Сохраняет вечернюю сессию в данные пользователя и запоминает разобранный объект"""
+    session_dict = session.to_dict()
+    user_data.current_evening_session = session_dict
+    _evening_session_cache[user_data.user_id] = (session_dict, session)
+    _evening_session_cache.move_to_end(user_data.user_id)
+    if len(_evening_session_cache) > EVENING_SESSION_CACHE_MAX:
+        _evening_session_cache.popitem(last=False)
+    save_user_data_later(user_data, fields=("current_evening_session",))
+
+def load_evening_session(user_data: TrackerUserData) -> EveningTrackingSession:
+    """Возвращает текущую вечернюю сессию пользователя
+    
+    Запись кэша забирается: если обработка прервется до store_evening_session,
+    следующее сообщение разберет сессию заново из сохраненного словаря.
+    """
+    session_dict = user_data.current_evening_session
+    cached = _evening_session_cache.pop(user_data.user_id, None)
+    if cached is not None and cached[0] is session_dict:
+        return cached[1]
+    return EveningTrackingSession.from_dict(session_dict)
+
+def start_evening_session(user_data: TrackerUserData, active_tasks: Optional[List[TrackerTask]] = None) -> EveningTrackingSession:
     """Начинает новую вечернюю сессию"""
     today = get_today_date_str(user_data)
     session = EveningTrackingSession(user_data.user_id, today)
     
     # Добавляем активные задачи для обзора
-    active_tasks = get_tasks_by_status(user_data, TaskStatus.PENDING) + get_tasks_by_status(user_data, TaskStatus.IN_PROGRESS)
+    if active_tasks is None:
+        active_tasks = get_active_tasks(user_data)
     for task in active_tasks:
         review_item = TaskReviewItem(task.id, task.title)
         session.task_reviews.append(review_item)
     
     session.state = EveningSessionState.TASK_REVIEW
-    user_data.current_evening_session = session.to_dict()
-    save_user_data(user_data)
+    store_evening_session(user_data, session)
     
     logger.info(f"Started evening session for user {user_data.user_id} with {len(session.task_reviews)} tasks")
     return session
@@ -1779,8 +2487,10 @@ async def process_evening_session(message: types.Message, user_data: TrackerUser
     if not user_data.current_evening_session:
         return False
     
-    session = EveningTrackingSession.from_dict(user_data.current_evening_session)
+    session = load_evening_session(user_data)
     user_message = message.text
+    # Каждый шаг сессии ждет ответа AI
+    show_typing(message)
     
     if session.state == EveningSessionState.TASK_REVIEW:
         await handle_task_review(message, user_data, session, user_message)
@@ -1791,6 +2501,46 @@ async def process_evening_session(message: types.Message, user_data: TrackerUser
     
     return True
 
+_EVENING_REPLY_HEADER = "🤖 **Вечерний AI-трекер:**\n\n"
+
+class StreamingReply:
+    """Ответ AI, который показывается по мере генерации
+    
+    update() получает накопленный текст и не чаще STREAM_EDIT_INTERVAL
+    отправляет или правит черновое сообщение; finish() показывает итоговый текст.
+    """
+    __slots__ = ('message', 'header', 'sent', 'last_edit')
+    
+    def __init__(self, message: types.Message, header: str = _EVENING_REPLY_HEADER):
+        self.message = message
+        self.header = header
+        self.sent = None
+        self.last_edit = 0.0
+    
+    async def update(self, text: str):
+        now = time.monotonic()
+        if now - self.last_edit < STREAM_EDIT_INTERVAL:
+            return
+        self.last_edit = now
+        try:
+            # Незакрытая разметка в черновике может не разобраться - такой кадр просто пропускаем
+            if self.sent is None:
+                self.sent = await throttled_send(self.message.answer, self.header + text + " ▌", parse_mode="Markdown")
+            else:
+                await throttled_send(self.sent.edit_text, self.header + text + " ▌", parse_mode="Markdown")
+        except Exception as e:
+            logger.debug(f"Skipped streaming update: {e}")
+    
+    async def finish(self, text: str):
+        if self.sent is None:
+            await self.message.answer(self.header + text, parse_mode="Markdown")
+        else:
+            await throttled_send(self.sent.edit_text, self.header + text, parse_mode="Markdown")
+
+# Ответы без прогресса по задаче: один проход по строке без lower()
+_NO_PROGRESS_RE = re.compile("ничего|не делал|нет", re.IGNORECASE)
+_NOTHING_DONE_RE = re.compile("ничего", re.IGNORECASE)
+
 async def handle_task_review(message: types.Message, user_data: TrackerUserData, session: EveningTrackingSession, user_message: str):
     """Обрабатывает обзор задач"""
     current_task_review = session.task_reviews[session.current_task_index]
@@ -1800,17 +2550,18 @@ async def handle_task_review(message: types.Message, user_data: TrackerUserData,
         current_task_review.progress_description = user_message
         session.ai_conversation.append({"role": "user", "content": user_message})
         
-        # Генерируем поддерживающий ответ от AI
-        support_response = await generate_task_support(user_data, current_task_review, user_message)
+        # Генерируем поддерживающий ответ от AI, показывая его по мере генерации
+        reply = StreamingReply(message)
+        support_response = await generate_task_support(user_data, current_task_review, user_message, on_text=reply.update)
         current_task_review.ai_support = support_response
         session.ai_conversation.append({"role": "assistant", "content": support_response})
         
         # Определяем, нужна ли помощь
-        if "ничего" in user_message.lower() or "не делал" in user_message.lower() or "нет" in user_message.lower():
+        if _NO_PROGRESS_RE.search(user_message):
             current_task_review.needs_help = True
-            await message.answer(f"🤖 **Вечерний AI-трекер:**\n\n{support_response}\n\nКак я могу помочь с этой задачей? Расскажите, что вас останавливает или с чем нужна поддержка.", parse_mode="Markdown")
+            await reply.finish(f"{support_response}\n\nКак я могу помочь с этой задачей? Расскажите, что вас останавливает или с чем нужна поддержка.")
         else:
-            await message.answer(f"🤖 **Вечерний AI-трекер:**\n\n{support_response}", parse_mode="Markdown")
+            await reply.finish(support_response)
             await move_to_next_task(message, user_data, session)
     
     elif current_task_review.needs_help and not current_task_review.help_provided:
@@ -1818,15 +2569,15 @@ async def handle_task_review(message: types.Message, user_data: TrackerUserData,
         current_task_review.help_provided = user_message
         session.ai_conversation.append({"role": "user", "content": user_message})
         
-        help_response = await generate_task_help(user_data, current_task_review, user_message)
+        reply = StreamingReply(message)
+        help_response = await generate_task_help(user_data, current_task_review, user_message, on_text=reply.update)
         session.ai_conversation.append({"role": "assistant", "content": help_response})
         
-        await message.answer(f"🤖 **Вечерний AI-трекер:**\n\n{help_response}", parse_mode="Markdown")
+        await reply.finish(help_response)
         await move_to_next_task(message, user_data, session)
     
     # Сохраняем изменения
-    user_data.current_evening_session = session.to_dict()
-    save_user_data(user_data)
+    store_evening_session(user_data, session)
 
 async def move_to_next_task(message: types.Message, user_data: TrackerUserData, session: EveningTrackingSession):
     """Переходит к следующей задаче или к вопросу благодарности"""
@@ -1840,80 +2591,113 @@ async def move_to_next_task(message: types.Message, user_data: TrackerUserData,
         # Спрашиваем про следующую задачу
         await ask_about_next_task(message, user_data, session)
 
+_TASK_QUESTION_TEMPLATE = (
+    "🤖 **Вечерний AI-трекер** ({task_num}/{total_tasks})\n\n"
+    "Расскажите, что удалось сделать сегодня по задаче:\n"
+    "**{task_title}**\n\n"
+    "Если ничего не делали - тоже не страшно, просто напишите 'ничего' или 'не делал'."
+)
+
 async def ask_about_next_task(message: types.Message, user_data: TrackerUserData, session: EveningTrackingSession):
     """Спрашивает про следующую задачу"""
     current_task_review = session.task_reviews[session.current_task_index]
-    task_num = session.current_task_index + 1
-    total_tasks = len(session.task_reviews)
     
-    text = (f"🤖 **Вечерний AI-трекер** ({task_num}/{total_tasks})\n\n"
-            f"Расскажите, что удалось сделать сегодня по задаче:\n"
-            f"**{current_task_review.task_title}**\n\n"
-            f"Если ничего не делали - тоже не страшно, просто напишите 'ничего' или 'не делал'.")
+    text = _TASK_QUESTION_TEMPLATE.format(
+        task_num=session.current_task_index + 1,
+        total_tasks=len(session.task_reviews),
+        task_title=current_task_review.task_title
+    )
     
     await message.answer(text, parse_mode="Markdown")
 
+_GRATITUDE_QUESTION_TEXT = (
+    "🤖 **Вечерний AI-трекер**\n\n"
+    "Последний вопрос на сегодня 😊\n\n"
+    "**За что вы благодарны себе сегодня?**\n\n"
+    "Это может быть что угодно - маленькое достижение, преодоление трудности, забота о себе, или даже просто то, что вы дошли до конца дня."
+)
+
 async def ask_gratitude_question(message: types.Message, user_data: TrackerUserData, session: EveningTrackingSession):
     """Задает вопрос благодарности"""
-    text = (f"🤖 **Вечерний AI-трекер**\n\n"
-            f"Последний вопрос на сегодня 😊\n\n"
-            f"**За что вы благодарны себе сегодня?**\n\n"
-            f"Это может быть что угодно - маленькое достижение, преодоление трудности, забота о себе, или даже просто то, что вы дошли до конца дня.")
-    
-    await message.answer(text, parse_mode="Markdown")
+    await message.answer(_GRATITUDE_QUESTION_TEXT, parse_mode="Markdown")
 
 async def handle_gratitude_question(message: types.Message, user_data: TrackerUserData, session: EveningTrackingSession, user_message: str):
     """Обрабатывает ответ на вопрос благодарности"""
     session.gratitude_answer = user_message
     session.ai_conversation.append({"role": "user", "content": user_message})
     
+    # Саммари дня зависит только от уже собранных ответов - запускаем его генерацию
+    # сразу, чтобы она шла параллельно с ответом на благодарность. Передаём снимок
+    # разговора: саммари детерминированно видит его без ответа на благодарность
+    summary_task = asyncio.create_task(generate_daily_summary(user_data, session, list(session.ai_conversation)))
+    
     # Генерируем благодарный ответ
-    gratitude_response = await generate_gratitude_response(user_data, user_message)
+    reply = StreamingReply(message)
+    gratitude_response = await generate_gratitude_response(user_data, user_message, on_text=reply.update)
     session.ai_conversation.append({"role": "assistant", "content": gratitude_response})
     
-    await message.answer(f"🤖 **Вечерний AI-трекер:**\n\n{gratitude_response}", parse_mode="Markdown")
+    await reply.finish(gratitude_response)
     
     # Переходим к генерации саммари
     session.state = EveningSessionState.SUMMARY
-    await complete_evening_session(message, user_data, session)
-
-async def complete_evening_session(message: types.Message, user_data: TrackerUserData, session: EveningTrackingSession):
-    """Завершает вечернюю сессию и создает саммари"""
+    await complete_evening_session(message, user_data, session, summary_task)
+
+_EVENING_SUMMARY_TEMPLATE = (
+    "🌙 **Итоги дня {date}**\n\n"
+    "{summary_text}\n\n"
+    "📊 **Статистика:**\n"
+    "• Задач рассмотрено: {tasks_reviewed}\n"
+    "• С прогрессом: {tasks_with_progress}\n"
+    "• Требовали помощи: {tasks_needing_help}\n\n"
+    "💫 Спокойной ночи! Завтра будет новый день для достижений."
+)
+
+async def complete_evening_session(message: types.Message, user_data: TrackerUserData, session: EveningTrackingSession,
+                                   summary_task: Optional[asyncio.Task] = None):
+    """Завершает вечернюю сессию и создает саммари
+    
+    summary_task - уже запущенная генерация саммари, если она была начата заранее.
+    """
     # Генерируем саммари дня
-    daily_summary = await generate_daily_summary(user_data, session)
-    
-    # Сохраняем саммари в долгосрочную память
-    user_data.daily_summaries.append(daily_summary.to_dict())
+    if summary_task is not None:
+        daily_summary = await summary_task
+    else:
+        daily_summary = await generate_daily_summary(user_data, session)
     
-    # Ограничиваем количество саммари (храним последние 30 дней)
-    if len(user_data.daily_summaries) > 30:
-        user_data.daily_summaries = user_data.daily_summaries[-30:]
+    # Сохраняем саммари в долгосрочную память (deque хранит последние DAILY_SUMMARIES_LIMIT дней)
+    add_daily_summary(user_data, daily_summary.to_dict())
     
     # Завершаем сессию
-    session.completed_at = int(time.time())
+    session.completed_at = int(request_now())
     session.state = EveningSessionState.COMPLETED
     session.summary = daily_summary.summary_text
     
-    # Очищаем текущую сессию
+    # Очищаем текущую сессию; итог дня записываем сразу, не дожидаясь таймера
     user_data.current_evening_session = None
-    save_user_data(user_data)
+    _evening_session_cache.pop(user_data.user_id, None)
+    save_user_data_later(user_data, fields=("current_evening_session", "daily_summaries"))
+    await flush_now()
     
     # Отправляем итоговое саммари
-    text = (f"🌙 **Итоги дня {daily_summary.date}**\n\n"
-            f"{daily_summary.summary_text}\n\n"
-            f"📊 **Статистика:**\n"
-            f"• Задач рассмотрено: {daily_summary.tasks_reviewed}\n"
-            f"• С прогрессом: {daily_summary.tasks_with_progress}\n"
-            f"• Требовали помощи: {daily_summary.tasks_needing_help}\n\n"
-            f"💫 Спокойной ночи! Завтра будет новый день для достижений.")
+    text = _EVENING_SUMMARY_TEMPLATE.format(
+        date=daily_summary.date,
+        summary_text=daily_summary.summary_text,
+        tasks_reviewed=daily_summary.tasks_reviewed,
+        tasks_with_progress=daily_summary.tasks_with_progress,
+        tasks_needing_help=daily_summary.tasks_needing_help
+    )
     
     await message.answer(text, parse_mode="Markdown")
     logger.info(f"Completed evening session for user {user_data.user_id}")
 
 # === Функции генерации AI-ответов для вечернего трекера ===
 
-async def generate_task_support(user_data: TrackerUserData, task_review: TaskReviewItem, user_message: str) -> str:
-    """Генерирует поддерживающий ответ AI по задаче"""
+async def generate_task_support(user_data: TrackerUserData, task_review: TaskReviewItem, user_message: str,
+                                on_text=None) -> str:
+    """Генерирует поддерживающий ответ AI по задаче
+    
+    on_text получает частичный ответ при потоковой генерации (см. ai_completion_text).
+    """
     try:
         system_prompt = """Ты - поддерживающий AI-ментор в вечернем трекере задач. 
 Твоя роль - дать короткую (1-2 предложения) эмоциональную поддержку пользователю по его прогрессу с задачей.
@@ -1925,7 +2709,8 @@ async def generate_task_support(user_data: TrackerUserData, task_review: TaskRev
         
         context = f"Задача: '{task_review.task_title}'\nОтвет пользователя: '{user_message}'"
         
-        response = await client.chat.completions.create(
+        return await ai_completion_text(
+            on_text,
             model=GPT4_MODEL,
             messages=[
                 {"role": "system", "content": system_prompt},
@@ -1935,8 +2720,6 @@ async def generate_task_support(user_data: TrackerUserData, task_review: TaskRev
             temperature=0.8
         )
         
-        return response.choices[0].message.content
-        
     except Exception as e:
         logger.error(f"Error generating task support: {e}")
         if "ничего" in user_message.lower() or "не делал" in user_message.lower():
@@ -1944,7 +2727,8 @@ async def generate_task_support(user_data: TrackerUserData, task_review: TaskRev
         else:
             return "Отлично! Любой прогресс важен, даже если кажется небольшим."
 
-async def generate_task_help(user_data: TrackerUserData, task_review: TaskReviewItem, help_request: str) -> str:
+async def generate_task_help(user_data: TrackerUserData, task_review: TaskReviewItem, help_request: str,
+                             on_text=None) -> str:
     """Генерирует помощь по задаче"""
     try:
         system_prompt = """Ты - помощник-ментор по продуктивности. 
@@ -1955,7 +2739,8 @@ async def generate_task_help(user_data: TrackerUserData, task_review: TaskReview
         
         context = f"Задача: '{task_review.task_title}'\nПроблема: '{help_request}'"
         
-        response = await client.chat.completions.create(
+        return await ai_completion_text(
+            on_text,
             model=GPT4_MODEL,
             messages=[
                 {"role": "system", "content": system_prompt},
@@ -1965,20 +2750,19 @@ async def generate_task_help(user_data: TrackerUserData, task_review: TaskReview
             temperature=0.7
         )
         
-        return response.choices[0].message.content
-        
     except Exception as e:
         logger.error(f"Error generating task help: {e}")
         return "Попробуйте разбить задачу на более мелкие шаги. Часто большие задачи кажутся сложными именно из-за своего размера."
 
-async def generate_gratitude_response(user_data: TrackerUserData, gratitude_message: str) -> str:
+async def generate_gratitude_response(user_data: TrackerUserData, gratitude_message: str, on_text=None) -> str:
     """Генерирует ответ на благодарность"""
     try:
         system_prompt = """Ты - поддерживающий AI-ментор. 
 Пользователь поделился тем, за что благодарен себе сегодня. 
 Дай теплый, вдохновляющий ответ (1-2 предложения), который подчеркивает важность самопризнания."""
         
-        response = await client.chat.completions.create(
+        return await ai_completion_text(
+            on_text,
             model=GPT4_MODEL,
             messages=[
                 {"role": "system", "content": system_prompt},
@@ -1988,20 +2772,24 @@ async def generate_gratitude_response(user_data: TrackerUserData, gratitude_mess
             temperature=0.8
         )
         
-        return response.choices[0].message.content
-        
     except Exception as e:
         logger.error(f"Error generating gratitude response: {e}")
         return "Прекрасно, что вы цените свои достижения! Признание собственных успехов - важная часть здорового отношения к себе."
 
-async def generate_daily_summary(user_data: TrackerUserData, session: EveningTrackingSession) -> DailySummary:
-    """Генерирует саммари дня для долгосрочной памяти"""
+async def generate_daily_summary(user_data: TrackerUserData, session: EveningTrackingSession,
+                                 conversation: Optional[list] = None) -> DailySummary:
+    """Генерирует саммари дня для долгосрочной памяти.
+
+    conversation - снимок разговора на момент запуска; по умолчанию берётся session.ai_conversation
+    """
+    if conversation is None:
+        conversation = session.ai_conversation
     summary = DailySummary(session.date, user_data.user_id)
     
     # Подсчитываем статистику
     summary.tasks_reviewed = len(session.task_reviews)
     summary.tasks_with_progress = sum(1 for review in session.task_reviews 
-                                    if review.progress_description and "ничего" not in review.progress_description.lower())
+                                    if review.progress_description and not _NOTHING_DONE_RE.search(review.progress_description))
     summary.tasks_needing_help = sum(1 for review in session.task_reviews if review.needs_help)
     
     # Определяем уровень продуктивности
@@ -2017,13 +2805,13 @@ async def generate_daily_summary(user_data: TrackerUserData, session: EveningTra
     
     try:
         # Генерируем краткое саммари через AI
-        conversation_text = "\n".join([f"{msg['role']}: {msg['content']}" for msg in session.ai_conversation[-10:]])
+        conversation_text = "\n".join([f"{msg['role']}: {msg['content']}" for msg in conversation[-10:]])
         
         system_prompt = """Создай краткое саммари дня (2-3 предложения) на основе вечерней сессии трекера.
 Включи: общий прогресс, настроение, ключевые инсайты.
 Пиши тепло и поддерживающе."""
         
-        response = await client.chat.completions.create(
+        response = await ai_chat_completion(
             model=GPT4_MODEL,
             messages=[
                 {"role": "system", "content": system_prompt},
@@ -2043,34 +2831,122 @@ async def generate_daily_summary(user_data: TrackerUserData, session: EveningTra
 
 # === Команды и UI для вечернего трекера ===
 
+# Значки приоритетов в списке задач вечернего трекера; остальные приоритеты - 📋
+_EVENING_PRIORITY_EMOJI = {TaskPriority.HIGH: "🔥", TaskPriority.URGENT: "⚡"}
+
+_EVENING_START_HEADER = (
+    "🌙 **Вечерний AI-трекер**\n\n"
+    "Давайте подведем итоги дня! Я пройдусь по каждой из ваших {count} активных задач, "
+    "поддержу вас и помогу, если нужно.\n\n"
+    "📋 **Задачи для обзора:**"
+)
+_EVENING_START_KEYBOARD = types.InlineKeyboardMarkup(inline_keyboard=[
+    [types.InlineKeyboardButton(text="🌙 Начать вечерний трекер", callback_data="tracker_evening_start")],
+    [types.InlineKeyboardButton(text="❌ Не сейчас", callback_data="tracker_main_menu")]
+])
+_EVENING_START_FOOTER = "\n🎯 В конце поговорим о том, за что вы благодарны себе сегодня.\n\nГотовы начать?"
+
 async def show_evening_tracker_start(message: types.Message, user_data: TrackerUserData):
     """Показывает начало вечернего трекера"""
-    if not can_start_evening_session(user_data):
+    active_tasks = get_active_tasks(user_data)
+    if not can_start_evening_session(user_data, active_tasks):
         text = "🌙 **Вечерний трекер недоступен**\n\nВозможные причины:\n• Трекер отключен в настройках\n• Нет активных задач\n• Сессия уже проведена сегодня"
         await message.answer(text, parse_mode="Markdown")
         return
     
-    active_tasks = get_tasks_by_status(user_data, TaskStatus.PENDING) + get_tasks_by_status(user_data, TaskStatus.IN_PROGRESS)
-    
-    text = (f"🌙 **Вечерний AI-трекер**\n\n"
-            f"Давайте подведем итоги дня! Я пройдусь по каждой из ваших {len(active_tasks)} активных задач, "
-            f"поддержу вас и помогу, если нужно.\n\n"
-            f"📋 **Задачи для обзора:**\n")
-    
-    for i, task in enumerate(active_tasks, 1):
-        priority_emoji = "🔥" if task.priority == TaskPriority.HIGH else "⚡" if task.priority == TaskPriority.URGENT else "📋"
-        text += f"{i}. {priority_emoji} {task.title}\n"
-    
-    text += f"\n🎯 В конце поговорим о том, за что вы благодарны себе сегодня.\n\nГотовы начать?"
-    
-    keyboard = types.InlineKeyboardMarkup(inline_keyboard=[
-        [types.InlineKeyboardButton(text="🌙 Начать вечерний трекер", callback_data="tracker_evening_start")],
-        [types.InlineKeyboardButton(text="❌ Не сейчас", callback_data="tracker_main_menu")]
-    ])
+    # Текст собирается одним join вместо наращивания строки по задачам
+    parts = [_EVENING_START_HEADER.format(count=len(active_tasks))]
+    parts.extend(
+        f"{i}. {_EVENING_PRIORITY_EMOJI.get(task.priority, '📋')} {task.title}"
+        for i, task in enumerate(active_tasks, 1)
+    )
+    parts.append(_EVENING_START_FOOTER)
+    text = "\n".join(parts)
     
-    await message.answer(text, reply_markup=keyboard, parse_mode="Markdown")
+    await message.answer(text, reply_markup=_EVENING_START_KEYBOARD, parse_mode="Markdown")
 
 async def start_evening_tracking_session(message: types.Message, user_data: TrackerUserData):
     """Запускает вечернюю сессию трекинга"""
     session = start_evening_session(user_data)
-    await ask_about_next_task(message, user_data, session)
\ No newline at end of file
+    await ask_about_next_task(message, user_data, session)
+
+# === Таблицы диспетчеризации callback-запросов ===
+# Собираются в конце модуля, когда все экраны уже определены
+
+EXACT_HANDLERS = {
+    "tracker_step_1_next": _step_transition(WelcomeState.STEP_2_ANXIETY_INTRO, show_step_2_anxiety_intro),
+    "tracker_anxiety_start": _h_anxiety_start,
+    "tracker_anxiety_skip": _step_transition(WelcomeState.STEP_3_GOALS, show_step_3_goals),
+    "tracker_step_3_goals": _step_transition(WelcomeState.STEP_3_GOALS, show_step_3_goals),
+    "tracker_step_2_back": _step_transition(WelcomeState.STEP_2_ANXIETY_INTRO, show_step_2_anxiety_intro),
+    "tracker_step_4_notifications": _step_transition(WelcomeState.STEP_4_NOTIFICATIONS, show_step_4_notifications),
+    "tracker_step_3_back": _step_transition(WelcomeState.STEP_3_GOALS, show_step_3_goals),
+    "tracker_step_4_back": _step_transition(WelcomeState.STEP_4_NOTIFICATIONS, show_step_4_notifications),
+    "tracker_step_5_ai_mentor": _step_transition(WelcomeState.STEP_5_AI_MENTOR, show_step_5_ai_mentor),
+    "tracker_meet_ai_mentor": _h_meet_ai_mentor,
+    "tracker_ai_mentor_continue": _h_ai_mentor_continue,
+    "tracker_step_6_completion": _step_transition(WelcomeState.STEP_6_COMPLETION, show_step_6_completion, flush=True),
+    "tracker_start_main": _screen(show_main_menu),
+    "tracker_main_menu": _screen(show_main_menu),
+    "tracker_show_tasks": _screen(show_tasks_menu),
+    "tracker_new_task": _screen(start_task_creation),
+    "tracker_cancel_creation": _h_cancel_creation,
+    "tracker_ai_mentor_chat": _h_ai_mentor_chat,
+    "tracker_settings": _screen(show_settings_menu),
+    "tracker_settings_notifications": _screen(show_notification_settings),
+    "tracker_settings_timezone": _screen(show_timezone_settings),
+    "tracker_test_digest": _h_test_digest,
+    "tracker_evening_tracker": _screen(show_evening_tracker_start),
+    "tracker_evening_start": _screen(start_evening_tracking_session),
+}
+
+# Обработчики сообщений приветственного модуля по текущему шагу
+WELCOME_HANDLERS = {
+    WelcomeState.STEP_1_GREETING: show_step_1_greeting,
+    WelcomeState.STEP_2_ANXIETY_INTRO: show_step_2_anxiety_intro,
+    WelcomeState.STEP_2_ANXIETY_SURVEY: handle_anxiety_survey,
+    WelcomeState.STEP_3_GOALS: handle_goals_selection,
+    WelcomeState.STEP_4_NOTIFICATIONS: handle_notifications_setup,
+    WelcomeState.STEP_5_AI_MENTOR: handle_ai_mentor_intro,
+    WelcomeState.STEP_6_COMPLETION: handle_completion,
+}
+
+# Префиксы с хвостом callback_data; все они перечислены в одном
+# скомпилированном выражении, поэтому разбор выполняется за один проход
+PREFIX_HANDLERS = {
+    "tracker_task_detail_": _h_task_detail,
+    "tracker_anxiety_answer_": _h_anxiety_answer,
+    "tracker_goal_toggle_": _h_goal_toggle,
+    "tracker_notif_toggle_": _h_notif_toggle,
+    "tracker_start_task_": _h_start_task,
+    "tracker_complete_task_": _h_complete_task,
+    "tracker_filter_": _h_filter,
+    "tracker_anxiety_back_": _h_anxiety_back,
+    "tracker_pause_task_": _h_reset_task,
+    "tracker_reopen_task_": _h_reset_task,
+    "tracker_edit_priority_": _h_edit_priority,
+    "tracker_set_priority_": _h_set_priority,
+    "tracker_delete_task_": _h_delete_task,
+    "tracker_confirm_delete_": _h_confirm_delete,
+    "tracker_set_timezone_": _h_set_timezone,
+}
+_PREFIX_RE = re.compile("(" + "|".join(map(re.escape, PREFIX_HANDLERS)) + ")")
+
+# Текстовые команды основного режима (сравниваются с началом сообщения)
+COMMAND_HANDLERS = {
+    '/задачи': show_tasks_menu,
+    '/tasks': show_tasks_menu,
+    'задачи': show_tasks_menu,
+    'tasks': show_tasks_menu,
+    '/новая': start_task_creation,
+    '/new': start_task_creation,
+    'новая задача': start_task_creation,
+    'создать задачу': start_task_creation,
+    '/меню': show_main_menu,
+    '/menu': show_main_menu,
+    'меню': show_main_menu,
+    '/вечерний': show_evening_tracker_start,
+    '/evening': show_evening_tracker_start,
+    'вечерний трекер': show_evening_tracker_start,
+}
+_COMMAND_RE = re.compile("(" + "|".join(map(re.escape, COMMAND_HANDLERS)) + ")")
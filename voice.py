@@ -1,18 +1,76 @@
+import asyncio
+import httpx
+import tempfile
+import time
+from collections import OrderedDict
 from aiogram import types
 from .client import client
 from .logger import create_logger
 
 logger = create_logger(__name__)
 
+# transcriptions run in parallel, but a burst of voice notes
+# is capped at VOICE_CONCURRENCY simultaneous Whisper requests
+VOICE_CONCURRENCY = 4
+_voice_sem = asyncio.Semaphore(VOICE_CONCURRENCY)
+
+# a hung transcription must not hold a pool connection and a semaphore slot forever,
+# but a long voice note needs time to upload and transcribe: the read budget grows with its duration
+VOICE_CONNECT_TIMEOUT = 5.0
+VOICE_TIMEOUT_BASE = 60.0
+VOICE_TIMEOUT_PER_SECOND = 2.0
+
+
+def voice_timeout(duration) -> httpx.Timeout:
+  return httpx.Timeout(VOICE_TIMEOUT_BASE + VOICE_TIMEOUT_PER_SECOND * (duration or 0), connect=VOICE_CONNECT_TIMEOUT)
+
+# recent transcriptions by file_unique_id (stable for the same audio, also across forwards):
+# file_unique_id -> (expires_at, text); concurrent requests for one file share a single task
+VOICE_CACHE_MAX = 1024
+VOICE_CACHE_TTL = 600
+_voice_cache = OrderedDict()
+_voice_in_flight = {}
+
 
 async def decode_voice(message: types.Message) -> str | None:
+  key = message.voice.file_unique_id
+  cached = _voice_cache.get(key)
+  if cached is not None:
+    if cached[0] > time.monotonic():
+      _voice_cache.move_to_end(key)
+      return cached[1]
+    del _voice_cache[key]
+
+  task = _voice_in_flight.get(key)
+  if task is None:
+    task = asyncio.ensure_future(_transcribe(message))
+    _voice_in_flight[key] = task
+    task.add_done_callback(lambda _: _voice_in_flight.pop(key, None))
+
+  text = await asyncio.shield(task)
+  if text is not None:
+    _voice_cache[key] = (time.monotonic() + VOICE_CACHE_TTL, text)
+    _voice_cache.move_to_end(key)
+    if len(_voice_cache) > VOICE_CACHE_MAX:
+      _voice_cache.popitem(last=False)
+  return text
+
+
+async def _transcribe(message: types.Message) -> str | None:
   try:
-    file = await message.bot.download(message.voice.file_id)
-    file.name = "voice.ogg"
-    response = await client.audio.transcriptions.create(
-        model="whisper-1",
-        file=file
-    )
+    # the voice note goes to disk instead of a BytesIO, so memory use does not grow with its length;
+    # the .ogg suffix lets the API infer the format from the file name;
+    # the SDK accepts only real io objects, so the underlying file is passed, not the wrapper
+    with tempfile.NamedTemporaryFile(suffix=".ogg") as file:
+      await message.bot.download(message.voice.file_id, destination=file)
+      file.seek(0)
+      async with _voice_sem:
+        # 429, 5xx and connection errors are retried by the SDK itself (2 retries with backoff)
+        response = await client.audio.transcriptions.create(
+            model="whisper-1",
+            file=file.file,
+            timeout=voice_timeout(message.voice.duration)
+        )
     return response.text.strip()
   except Exception as error:
     logger.error(f"decode_voice:{error}")